@@ -0,0 +1,247 @@
+import os, sys, time, json, math, platform, argparse, statistics, tempfile
+from array import array
+
+# benchmarks never open a window or play sound
+os.environ['SDL_VIDEODRIVER'] = 'dummy'
+os.environ['SDL_AUDIODRIVER'] = 'dummy'
+os.environ['PYGAME_HIDE_SUPPORT_PROMPT'] = '1'
+
+import pygame
+
+from main import App
+from src.util import rng
+from src.tiles import TileMap, DESTRUCTION_TIME
+from src.grid import type_id
+from src.smoke import Smoke
+from mapgen import generate_map
+
+MAPS_PATH = 'data/maps/'
+# samples taken per case
+REPEAT = 20
+# side length (tiles) of the square stress maps, the shipped maps fit in 180 x 180
+STRESS_SIZES = [180, 600]
+STRESS_DENSITY = 0.3
+# particles alive while timing each particle system
+PARTICLES = {'kickup': 5000, 'sparks': 2000, 'smoke': 200, 'fire': 2048}
+# player ticks per player.update sample
+PLAYER_TICKS = 60
+# most screens drawn per tiles.draw sample
+DRAW_VIEWS = 32
+# a case is flagged when its median grows by more than this fraction
+REGRESSION_THRESHOLD = 0.15
+
+def summarize(samples):
+    ordered = sorted(samples)
+    return {
+        'median_ms': statistics.median(ordered),
+        'p95_ms': ordered[min(len(ordered) - 1, round(0.95 * (len(ordered) - 1)))],
+        'min_ms': ordered[0],
+        'samples': len(ordered),
+    }
+
+def measure(func, repeat=REPEAT, setup=None):
+    """Time func() repeat times (ms), setup() runs untimed before each sample"""
+    samples = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    return summarize(samples)
+
+def load_map(app, path):
+    tile_map = TileMap(app)
+    tile_map.load(path)
+    return tile_map
+
+def clear_particles(app):
+    app.kickup.clear()
+    app.sparks.clear()
+    app.smoke.clear()
+    app.fire.clear()
+
+def bench_map(app, path, repeat):
+    """Time every tile map & player path on one map, returns {case: summary}"""
+    results = {}
+    results['tiles.load'] = measure(lambda: load_map(app, path), repeat)
+
+    tile_map = load_map(app, path)
+    grid = tile_map.grid
+
+    def reset_variants():
+        grid.variants = array('B', bytes(len(grid.variants)))
+    results['tiles.auto_tile'] = measure(tile_map.auto_tile, repeat, reset_variants)
+
+    # sweep the screen over the map, at most DRAW_VIEWS screens per sample
+    width, height = app.screen.get_size()
+    ox, oy = grid.origin
+    columns = max(1, math.ceil(grid.width * tile_map.tile_size / width))
+    rows = max(1, math.ceil(grid.height * tile_map.tile_size / height))
+    views = [(ox * tile_map.tile_size + x * width, oy * tile_map.tile_size + y * height) for y in range(rows) for x in range(columns)]
+    views = views[::max(1, len(views) // DRAW_VIEWS)][:DRAW_VIEWS]
+
+    def draw():
+        for scroll in views:
+            tile_map.draw(app.screen, scroll)
+    def drop_chunks():
+        tile_map.chunks = {}
+        tile_map.chunk_tiles = {}
+    results['tiles.draw_cold'] = measure(draw, repeat, drop_chunks)
+    results['tiles.draw'] = measure(draw, repeat)
+
+    # each sample destroys one landing's worth (3x3) of clouds in a single update,
+    # the map is reloaded (untimed) whenever its clouds run out so no sample times an idle update
+    batches = []
+    def mark_batch():
+        clear_particles(app)
+        if not batches:
+            tile_map.load(path)
+            clouds = sorted(tile_map.grid.of_type(type_id('cloud')))
+            batches.extend(clouds[i:i + 9] for i in range(0, max(1, len(clouds) - 8), 9))
+        for i in batches.pop(0):
+            tile_map.mark_tile_for_destruction(tile_map.grid.pos(i), -DESTRUCTION_TIME)
+    results['tiles.update'] = measure(lambda: tile_map.update(1 / 60), repeat, mark_batch)
+
+    tile_map = load_map(app, path)
+    player = app.player
+    def spawn():
+        rng.seed(0)
+        player.pos = pygame.Vector2(50, 10)
+        player.movement = pygame.Vector2(0, 0)
+        player.falling = 30
+    def run_player():
+        for tick in range(PLAYER_TICKS):
+            player.controls['right'] = True
+            player.controls['up'] = tick % 20 < 6
+            player.update(1, tile_map)
+    results['player.update'] = measure(run_player, repeat, spawn)
+    player.controls = {'up': False, 'down': False, 'left': False, 'right': False}
+
+    # kickup bounces off the map, so it's timed per map
+    cells = grid.occupied() or [0]
+    def fill_kickup():
+        rng.seed(0)
+        clear_particles(app)
+        for _ in range(PARTICLES['kickup']):
+            x, y = grid.pos(rng.choice(cells))
+            app.kickup.add([x * 8 + rng.random() * 8, y * 8 - rng.random() * 16], [rng.random() * 4 - 2, rng.random() * 4 - 2], rng.random() + 9, (255, 255, 255))
+    results['kickup.update'] = measure(lambda: app.kickup.update(1, tile_map), repeat, fill_kickup)
+    clear_particles(app)
+    return results
+
+def bench_particles(app, repeat):
+    """Time the particle systems that don't touch the map"""
+    results = {}
+    def fill_sparks():
+        rng.seed(0)
+        app.sparks.clear()
+        for _ in range(PARTICLES['sparks']):
+            app.sparks.add([rng.random() * 320, rng.random() * 240], rng.random() * 2 * math.pi, rng.random() * 1.5 + 0.5, (255, 255, 255))
+    results['sparks.update'] = measure(lambda: app.sparks.update(1), repeat, fill_sparks)
+
+    smoke = []
+    def fill_smoke():
+        rng.seed(0)
+        smoke[:] = [Smoke(rng.random() * 320, rng.random() * 240, rng.random() * 2 - 1, rng.random() * 2 - 1, (255, 255, 255)) for _ in range(PARTICLES['smoke'])]
+    def update_smoke():
+        for bit in smoke:
+            bit.update(1)
+    results['smoke.update'] = measure(update_smoke, repeat, fill_smoke)
+
+    def fill_fire():
+        rng.seed(0)
+        app.fire.clear()
+        for _ in range(PARTICLES['fire']):
+            app.fire.add([rng.random() * 320, rng.random() * 240], rng.random() * (len(app.fire.frames) - 1))
+    results['fire.update'] = measure(lambda: app.fire.update(1), repeat, fill_fire)
+    clear_particles(app)
+    return results
+
+def run(maps=None, stress=STRESS_SIZES, repeat=REPEAT, log=sys.stderr):
+    """Run every case, returns the results dict that gets written as json"""
+    app = App()
+    # the player & particle pools the cases time are only built when a game starts
+    app.setup_game()
+    if maps is None:
+        maps = sorted((name[:-5] for name in os.listdir(MAPS_PATH) if name.endswith('.json')), key=lambda name: (len(name), name))
+    cases = {}
+    for name in maps:
+        print(f"map {name}", file=log)
+        for case, summary in bench_map(app, MAPS_PATH + name + '.json', repeat).items():
+            cases[f"{name}/{case}"] = summary
+    with tempfile.TemporaryDirectory() as folder:
+        for size in stress:
+            print(f"stress {size}x{size}", file=log)
+            path = os.path.join(folder, f"stress_{size}.json")
+            generate_map(path, size, size, density=STRESS_DENSITY, seed=size)
+            for case, summary in bench_map(app, path, repeat).items():
+                cases[f"stress_{size}/{case}"] = summary
+    print("particles", file=log)
+    for case, summary in bench_particles(app, repeat).items():
+        cases[f"particles/{case}"] = summary
+    return {
+        'meta': {
+            'python': platform.python_version(),
+            'pygame': pygame.version.ver,
+            'platform': platform.platform(),
+            'repeat': repeat,
+            'time': time.strftime('%Y-%m-%d %H:%M:%S'),
+        },
+        'cases': cases,
+    }
+
+def compare(baseline, current, threshold=REGRESSION_THRESHOLD):
+    """Lines comparing medians case by case, and the names of cases that got slower than threshold allows"""
+    lines = [f"{'case':<36} {'base ms':>10} {'now ms':>10} {'change':>8}"]
+    regressions = []
+    for case, now in current['cases'].items():
+        base = baseline['cases'].get(case)
+        if base is None:
+            lines.append(f"{case:<36} {'-':>10} {now['median_ms']:>10.3f} {'new':>8}")
+            continue
+        change = now['median_ms'] / base['median_ms'] - 1 if base['median_ms'] else 0.0
+        flag = ''
+        if change > threshold:
+            regressions.append(case)
+            flag = '  REGRESSION'
+        lines.append(f"{case:<36} {base['median_ms']:>10.3f} {now['median_ms']:>10.3f} {change:>+8.1%}{flag}")
+    return lines, regressions
+
+def read_results(path):
+    with open(path) as f:
+        return json.load(f)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the tile map, player & particle hot paths")
+    commands = parser.add_subparsers(dest='command', required=True)
+    run_parser = commands.add_parser('run', help="run the benchmarks and write json results")
+    run_parser.add_argument('--out', default='bench.json')
+    run_parser.add_argument('--repeat', type=int, default=REPEAT)
+    run_parser.add_argument('--maps', nargs='*', help="maps in data/maps to run (default all)")
+    run_parser.add_argument('--stress', type=int, nargs='*', default=STRESS_SIZES, help="sizes of the synthetic stress maps")
+    run_parser.add_argument('--baseline', help="compare against these results once done")
+    run_parser.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD)
+    compare_parser = commands.add_parser('compare', help="flag regressions between two result files")
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('current')
+    compare_parser.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD)
+    args = parser.parse_args()
+
+    if args.command == 'run':
+        results = run(args.maps, args.stress, args.repeat)
+        with open(args.out, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"wrote {args.out}", file=sys.stderr)
+        baseline = args.baseline
+        current = results
+    else:
+        baseline = args.baseline
+        current = read_results(args.current)
+
+    if baseline:
+        lines, regressions = compare(read_results(baseline), current, args.threshold)
+        print('\n'.join(lines))
+        if regressions:
+            print(f"{len(regressions)} regression(s) over {args.threshold:.0%}: {', '.join(regressions)}")
+            sys.exit(1)
@@ -1,5 +1,8 @@
 import pygame, sys, time, math, json
 
+from src.mapfile import is_map_file, save_level, load_level
+from src.atlas import load_atlas
+
 # window dimensions
 SCR_WIDTH = 2100
 SCR_HEIGHT = 1200
@@ -13,9 +16,19 @@ CHUNK_SIZE = 9
 LEVEL_WIDTH = 20
 LEVEL_HEIGHT = 20
 
-# json map path
+# map path, json or binary (.map)
 MAP = "data/maps/0.json"
 
+# tile sets: name -> (sheet, frame size, frames), baked into one atlas by src/atlas.py
+SHEETS = {
+    "grass": ("tiles/grass.png", (TILE_SIZE, TILE_SIZE), (4, 4)),
+    "cloud": ("tiles/cloud.png", (TILE_SIZE, TILE_SIZE), (4, 4)),
+    "rock": ("tiles/rock.png", (TILE_SIZE, TILE_SIZE), (4, 4)),
+    "moss": ("tiles/moss.png", (TILE_SIZE, TILE_SIZE), (4, 4)),
+    "portal": ("tiles/portal_spritesheet.png", (TILE_SIZE, TILE_SIZE), (4, 4)),
+    "large_decor": ("tiles/large_decor.png", (50, 50), None),
+}
+
 # tile sets that can be autotiled
 AUTO_TILE_TYPES = {'grass', 'cloud', 'rock', 'portal', 'moss'}
 AUTO_TILE_MAP = {'0011': 1, '1011': 2, '1001': 3, '0001': 4, '0111': 5, '1111': 6, '1101': 7, '0101': 8,
@@ -50,19 +63,7 @@ class Editor:
         self.load(MAP)
 
         # assets
-        self.assets = {
-            "grass": self.load_tileset(pygame.image.load("data/images/tiles/grass.png").convert()),
-            "cloud": self.load_tileset(pygame.image.load("data/images/tiles/cloud.png").convert()),
-            "rock": self.load_tileset(pygame.image.load("data/images/tiles/rock.png").convert()),
-            "moss": self.load_tileset(pygame.image.load("data/images/tiles/moss.png").convert()),
-            "portal": self.load_tileset(pygame.image.load("data/images/tiles/portal_spritesheet.png").convert()),
-            "large_decor": self.load_sheet(pygame.image.load("data/images/tiles/large_decor.png").convert_alpha(), [50, 50])
-        }
-
-        # set colorkeys
-        for key in self.assets:
-            for surf in self.assets[key]:
-                surf.set_colorkey((0, 0, 0))
+        self.assets = load_atlas('editor', SHEETS)
 
         # left click & right click flags
         self.click = False
@@ -83,19 +84,25 @@ class Editor:
 
     # create new level
     def create_new(self, path):
+        if is_map_file(path):
+            save_level(path, {'tiles': [], 'off_grid': []})
+            return
         f = open(path, 'w')
         # write basic json level data
         json.dump({'level': {'tiles': [], 'off_grid': []}}, f, separators=(',', ':'))
         f.close()
 
-    # load json level data from path
+    # load json or binary level data from path
     def load(self, path):
         try:
-            # open file
-            f = open(path, 'r')
-            # load
-            data = json.load(f)
-            f.close()
+            if is_map_file(path):
+                data = {'level': load_level(path)}
+            else:
+                # open file
+                f = open(path, 'r')
+                # load
+                data = json.load(f)
+                f.close()
 
             self.tile_map = {}
             self.off_grid = []
@@ -119,15 +126,18 @@ class Editor:
 
     # save level data
     def save(self, path):
-        with open(path, 'w') as f:
-            tiles = []
-            off_grid = []
-            for loc in self.tile_map:
-                tiles.append({'pos': [int(c) for c in loc.split(';')], 'type': self.tile_map[loc]['type'], 'variant': self.tile_map[loc]['variant']})
-            for tile in self.off_grid:
-                off_grid.append({'pos': tile['pos'], 'type': tile['type'], 'variant': tile['variant']});
-            json.dump({'level': {'tiles': tiles, 'off_grid': off_grid}}, f, separators=(',', ':'))
-            print(f"Saved level data to `{path}`")
+        tiles = []
+        off_grid = []
+        for loc in self.tile_map:
+            tiles.append({'pos': [int(c) for c in loc.split(';')], 'type': self.tile_map[loc]['type'], 'variant': self.tile_map[loc]['variant']})
+        for tile in self.off_grid:
+            off_grid.append({'pos': tile['pos'], 'type': tile['type'], 'variant': tile['variant']});
+        if is_map_file(path):
+            save_level(path, {'tiles': tiles, 'off_grid': off_grid})
+        else:
+            with open(path, 'w') as f:
+                json.dump({'level': {'tiles': tiles, 'off_grid': off_grid}}, f, separators=(',', ':'))
+        print(f"Saved level data to `{path}`")
 
     def auto_tile(self):
         for loc in self.tile_map:
@@ -175,25 +185,6 @@ class Editor:
                 if loc in self.tile_map:
                     self.screen.blit(self.assets[self.tile_map[loc]["type"]][self.tile_map[loc]['variant']], (x * TILE_SIZE - self.scroll.x, y * TILE_SIZE - self.scroll.y))
 
-    def load_tileset(self, sheet):
-        tiles = []
-        for y in range(4):
-            for x in range(4):
-                tile_surf = pygame.Surface((TILE_SIZE, TILE_SIZE))
-                tile_surf.blit(sheet, (-x * TILE_SIZE, -y * TILE_SIZE))
-                tile_surf.set_colorkey((0, 0, 0))
-                tiles.append(tile_surf)
-        return tiles
-
-    def load_sheet(self, sheet, tile_size):
-        tiles = []
-        for x in range(math.floor(sheet.get_width() / tile_size[0])):
-            tile_surf = pygame.Surface(tile_size)
-            tile_surf.blit(sheet, (-x * tile_size[0], 0))
-            tile_surf.set_colorkey((0, 0, 0))
-            tiles.append(tile_surf)
-        return tiles
-
     def update(self):
         self.scroll.x += (int(self.controls['right']) - int(self.controls['left'])) * 5 * self.dt
         self.scroll.y += (int(self.controls['down']) - int(self.controls['up'])) * 5 * self.dt
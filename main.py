@@ -1,89 +1,152 @@
-import asyncio, pygame, random, time, math, sys, platform
+import time
+# before the other imports, so the startup trace counts them
+IMPORT_START = time.perf_counter()
 
-from src.util import load_image, load_sound, load_tile_imgs, load_animation, load_palette
+import asyncio, random, sys, os, platform, json, argparse
+
+# headless runs (soak tests, perf checks) use SDL's dummy drivers, which have to be picked before pygame starts
+# only when run as a script, importing main.py leaves the environment alone
+HEADLESS = __name__ == "__main__" and '--headless' in sys.argv
+if HEADLESS:
+    os.environ['SDL_VIDEODRIVER'] = 'dummy'
+    os.environ['SDL_AUDIODRIVER'] = 'dummy'
+    # keep stdout clean for the json summary
+    os.environ['PYGAME_HIDE_SUPPORT_PROMPT'] = '1'
+
+import pygame
+
+from src.util import load_image, load_sound, load_palette, rng
+from src.atlas import load_atlas
+from src.assets import Assets
 from src.tiles import TileMap
+from src.mapfile import MAP_EXTENSION
 from src.player import Player
+from src.kickup import Kickup
+from src.sparks import SparkSystem
+from src.fire import Fire
+from src.quality import Quality
+from src.layers import Layers
+from src.text import TextCache
+from src.replay import Recorder, Replay
+from src.profiler import Profiler
+from src.prefetch import LevelPrefetch
+from src.startup import StartupTrace, FIRST_FRAME_BUDGET
 from src.smoke import *
 
-# conor was here
-pygame.init()
-pygame.mixer.init()
-
 # ----------- GLOBALS ----------- #
 # check if python is running through emscripten
 WEB_PLATFORM = sys.platform == "emscripten"
 if WEB_PLATFORM:
     # for document/canvas interaction
     import js # type: ignore
-    # keep pixelated look for pygbag
-    platform.window.canvas.style.imageRendering = "pixelated"
 
 WIDTH, HEIGHT = 640, 480
 SCALE = 2
 
-MAP = "data/maps/0.json"
+SOUNDS = {
+    "sfx/jump": "sfx/jump.ogg",
+    "sfx/falling": "sfx/falling.ogg",
+    "sfx/portal": "sfx/portal.ogg",
+    "sfx/raining": "sfx/raining.ogg",
+    "sfx/explosion": "sfx/vanish.ogg",
+    "sfx/start": "sfx/start.ogg",
+}
+# sliced sprites: asset name -> (sheet, frame size, frames), see src/atlas.py
+SHEETS = {
+    # tiles
+    "tiles/grass": ("tiles/cloud_tuft.png", (8, 8), None),
+    "tiles/cloud": ("tiles/cloud.png", (8, 8), None),
+    "tiles/rock": ("tiles/rock.png", (8, 8), None),
+    "tiles/moss": ("tiles/moss.png", (8, 8), None),
+    "tiles/portal": ("tiles/portal_spritesheet.png", (8, 16), 4),
+    "tiles/large_decor": ("tiles/Cloud_large_decor.png", (50, 50), 6),
+    # player
+    "player/idle": ("player/idle.png", (5, 8), 5),
+    "player/run": ("player/run.png", (5, 8), 4),
+    "player/jump": ("player/jump.png", (5, 8), 4),
+    "player/land": ("player/land.png", (5, 8), 5),
+    # particles
+    "fire": ("flame.png", (5, 5), 9),
+}
 
-pygame.mixer.music.load("data/audio/chicken.ogg")
+# assets preloaded in the background while the menu is up, so starting a game doesn't stall
+# ("tiles/cloud" brings in the whole atlas the game's sprites come from)
+GAME_ASSETS = ["tiles/cloud", "sfx/start", "sfx/jump", "sfx/falling", "sfx/explosion", "sfx/portal"]
+
+# simulation ticks per second, rendering runs at whatever rate it can
+TICK_RATE = 60
+# most ticks simulated in one frame before we give up catching up
+MAX_TICKS_PER_FRAME = 5
+
+# conor was here
+def init_pygame():
+    """Start pygame & the mixer and load the music, the App does this before opening its window"""
+    pygame.init()
+    pygame.mixer.init()
+    if WEB_PLATFORM:
+        # keep pixelated look for pygbag
+        platform.window.canvas.style.imageRendering = "pixelated"
+    pygame.mixer.music.load("data/audio/chicken.ogg")
 
 # annelies was here
 class App:
-    def __init__(self):
+    def __init__(self, startup=None):
+        # how long each part of starting up took, closed off by the first frame
+        self.startup = startup or StartupTrace()
+        # print the startup trace once the first frame is up
+        self.show_startup = False
+        init_pygame()
+        self.startup.mark('pygame init')
+
         # no need for separate scaling, pygbag scales canvas automatically
         self.display = pygame.display.set_mode((WIDTH, HEIGHT), flags=pygame.RESIZABLE)
         self.screen = pygame.Surface((WIDTH // SCALE, HEIGHT // SCALE))
+        self.startup.mark('display')
         self.active = True # if tab is focused when running through web
 
         self.clock = pygame.time.Clock()
-        # delta time
-        self.dt = 1
+        # scales effects down when frames take too long
+        self.quality = Quality()
+        # per-phase frame timings, F3 shows them & F4 writes them to csv
+        self.profiler = Profiler()
+        # delta time (in 60fps frames) of one simulation tick
+        self.tick_rate = TICK_RATE
+        self.dt = 60 / self.tick_rate
         self.last_time = time.time() - 1/60
+        # real time (seconds) not simulated yet
+        self.accumulator = 0.0
+        # one-off inputs (start, restart, pause, reset) waiting for the next tick
+        self.actions = []
+        # input recording / playback, see start_recording & start_replay
+        self.recorder = None
+        self.replay = None
+        self.replay_tick = 0
 
-        # sfx & image assets
-        self.assets = {
-            # tiles
-            "tiles/grass": load_tile_imgs("tiles/cloud_tuft.png", 8),
-            "tiles/cloud": load_tile_imgs("tiles/cloud.png", 8),
-            "tiles/rock": load_tile_imgs("tiles/rock.png", 8),
-            "tiles/moss": load_tile_imgs("tiles/moss.png", 8),
-            "tiles/portal": load_animation("tiles/portal_spritesheet.png", (8, 16), 4),
-            # Nathan was here
-            # sfx
-            "sfx/jump": load_sound("sfx/jump.ogg"),
-            "sfx/falling": load_sound("sfx/falling.ogg"),
-            "sfx/portal": load_sound("sfx/portal.ogg"),
-            "sfx/raining": load_sound("sfx/raining.ogg"),
-            "sfx/explosion": load_sound("sfx/vanish.ogg"),
-            "sfx/start": load_sound("sfx/start.ogg"),
-            # player
-            "player/idle": load_animation("player/idle.png", [5, 8], 5),
-            "player/run": load_animation("player/run.png", [5, 8], 4),
-            "player/jump": load_animation("player/jump.png", [5, 8], 4),
-            "player/land": load_animation("player/land.png", [5, 8], 5),
-            # bg
-            "backdrop": load_image("tiles/background.png"),
-            "tiles/large_decor": load_animation("tiles/Cloud_large_decor.png", [50, 50], 6),
-            "clouds_single": load_image("tiles/clouds_single.png"),
-            # particles
-            "fire": load_animation("flame.png", [5, 5], 9)
-        }
-        self.kickup_palette = load_palette(self.assets["tiles/cloud"][0])
-
-        self.tile_map = TileMap(self)
-        self.tile_map.load(MAP)
-
-        self.scroll = pygame.Vector2(0, 0)
-        self.screen_shake = 0
+        # sfx & image assets, each one is loaded when it's first used
+        self.assets = Assets()
+        for name, path in SOUNDS.items():
+            self.assets.add(name, load_sound, path)
+        self.assets.add("backdrop", load_image, "tiles/background.png")
+        self.assets.add("clouds_single", load_image, "tiles/clouds_single.png")
+        # tiles, animations & particles come out of one baked atlas
+        self.assets.add_group("atlas", SHEETS, load_atlas, 'game', SHEETS)
+        # scaled backdrop & overlays, built by the first frame that draws them (see the layers property)
+        self.backdrop_layers = None
+        self.startup.mark('assets')
 
+        # empty until a game starts, restart_game loads the first level
         self.tile_map = TileMap(self)
-        self.tile_map.load(MAP)
 
         self.scroll = pygame.Vector2(0, 0)
         self.screen_shake = 0
         
         self.large_font = pygame.font.Font("data/fonts/PixelOperator8-Bold.ttf", 11)
         self.small_font = pygame.font.Font("data/fonts/PixelOperator8-Bold.ttf", 6)
+        # HUD & menu text is rendered through this so unchanged strings aren't re-rendered every frame
+        self.text = TextCache()
         self.game_over_message = random.randint(0, 4)
         self.state = "menu"
+        self.assets.preload_later(GAME_ASSETS)
         
         # Portal transition system
         self.transition_state = "none"  
@@ -92,15 +155,22 @@ class App:
         self.next_level = None
         self.current_level = 0
         self.max_levels = 8  # Number avl lvl (Jens told me to not comment alot, so I use abbrivations :) )
+        # the next level, built in the background while this one is played
+        self.prefetch = None
         
         # Fall detection threshold
         self.fall_threshold = 600  # If player falls below this Y position, restart
 
-        self.player = Player(self, [5, 8], [50, -10])
-        
-        # Initialize floating clouds system
+        # the player, fire, kickup colours & floating clouds need the atlas, so they're made
+        # by setup_game() when the first game starts rather than holding up the menu
+        self.player = None
+        self.kickup_palette = None
+        # positions at the previous tick, for render interpolation
+        self.prev_player_pos = None
+        self.prev_scroll = self.scroll.copy()
+        
+        # floating clouds system, filled in by setup_game()
         self.floating_clouds = []
-        self.init_floating_clouds()
         
         # Timer and level tracking
         self.game_start_time = 0
@@ -129,10 +199,10 @@ class App:
         self.prompt = self.large_font.render("Press ENTER to start", True, (255, 255, 255))
         self.logo_text = self.large_font.render("System of a Cloud", True, (255, 255, 255))
         self.logo = pygame.transform.scale((pygame.image.load("data/images/tiles/penguin_arm.png")), (78, 120))
-        self.kickup = []
-        self.sparks = []
+        self.kickup = Kickup()
+        self.sparks = SparkSystem()
         self.smoke = []
-        self.fire = []
+        self.fire = None
         
         # Start menu variables
         self.menu_title = self.large_font.render("System of a Cloud", True, (255, 255, 255))
@@ -146,49 +216,62 @@ class App:
             "WASD/Arrows: Move   Space/Up: Jump   P: Pause",
             "R: Reset Position   L: Toggle Times   ESC: Quit"
         ]
+        self.startup.mark('setup')
+
+    @property
+    def layers(self):
+        if self.backdrop_layers is None:
+            self.backdrop_layers = Layers(self.assets['backdrop'], self.screen.get_size())
+        return self.backdrop_layers
+
+    def setup_game(self):
+        """Build what only the game uses (everything that comes out of the atlas), once, the first time a game starts"""
+        if self.player is not None:
+            return
+        self.kickup_palette = load_palette(self.assets["tiles/cloud"][0])
+        self.fire = Fire(self.assets['fire'])
+        self.player = Player(self, [5, 8], [50, -10])
+        self.prev_player_pos = self.player.pos.copy()
+        if not self.floating_clouds:
+            self.init_floating_clouds()
     
-    def update_fire(self, render_scroll):
-        # [pos, frame]
-        for i, f in sorted(enumerate(self.fire), reverse=True):
-            f[0][1] -= 2 * self.dt;
-            f[1] += 0.5 * self.dt
-            if f[1] >= len(self.assets['fire']):
-                self.fire.pop(i)
-            else:
-                self.screen.blit(self.assets['fire'][math.floor(f[1])], (f[0][0] - render_scroll[0] - 2.5, f[0][1] - render_scroll[1] - 2.5))
-
-    def update_kickup(self, render_scroll):
-        # particle: [pos, vel, size, color]
-        for i, p in sorted(enumerate(self.kickup), reverse=True):
-            p[0][0] += p[1][0] * self.dt
-            if self.tile_map.solid_check(p[0]):
-                p[1][0] *= -0.8
-                p[1][1] *= 0.999
-
-            p[1][1] += 0.1 * self.dt
-            p[0][1] += p[1][1] * self.dt
-            if self.tile_map.solid_check(p[0]):
-                p[1][1] *= -0.8
-                p[1][0] *= 0.999
-
-            p[2] -= 0.1 * self.dt
-            if p[2] <= 0:
-                self.kickup.pop(i)
-            else:
-                color = pygame.Color(p[3][0], p[3][1], p[3][2], int(p[2] / 10 * 255))
-                self.screen.set_at((int(p[0][0] - render_scroll[0]), int(p[0][1] - render_scroll[1])), color)
-
-    def update_sparks(self, render_scroll):
-        for i, spark in sorted(enumerate(self.sparks), reverse=True):
-            spark.update(self.dt)
-            if spark.speed >= 0:
-                spark.draw(self.screen, render_scroll)
-            else:
-                self.sparks.pop(i)
+    def update_particles(self):
+        profiler = self.profiler
+        t = time.perf_counter()
+        self.kickup.update(self.dt, self.tile_map)
+        profiler.add('kickup', t)
+        t = time.perf_counter()
+        self.sparks.update(self.dt)
+        profiler.add('sparks', t)
+        t = time.perf_counter()
+        for i, bit in sorted(enumerate(self.smoke), reverse=True):
+            bit.update(self.dt)
+            if bit.timer > SMOKE_DELAY // FADE:
+                self.smoke.pop(i)
+        profiler.add('smoke', t)
+        t = time.perf_counter()
+        self.fire.update(self.dt)
+        profiler.add('fire', t)
+
+    def draw_particles(self, render_scroll):
+        profiler = self.profiler
+        t = time.perf_counter()
+        self.kickup.draw(self.screen, render_scroll)
+        profiler.add('kickup', t)
+        t = time.perf_counter()
+        self.sparks.draw(self.screen, render_scroll)
+        profiler.add('sparks', t)
+        t = time.perf_counter()
+        for bit in self.smoke:
+            bit.draw(self.screen, render_scroll)
+        profiler.add('smoke', t)
+        t = time.perf_counter()
+        self.fire.draw(self.screen, render_scroll)
+        profiler.add('fire', t)
 
     def menu(self):
         # Draw backdrop background instead of black fill
-        self.screen.blit(pygame.transform.scale(self.assets['backdrop'], self.screen.get_size()), (0, 0))
+        self.screen.blit(self.layers.backdrop, (0, 0))
         
         # Ensure logo is initialized when entering the menu
         if not hasattr(self, 'logo') or self.logo is None:
@@ -209,7 +292,7 @@ class App:
         button_spacing = 40
         
         for i, button in enumerate(self.menu_buttons):
-            button_text = self.large_font.render(button["text"], True, (255, 255, 255))
+            button_text = self.text.render(self.large_font, button["text"], (255, 255, 255))
             button_x = self.screen.get_width() // 2 - button_text.get_width() // 2
             button_rect = pygame.Rect(button_x - 10, button_y - 5, button_text.get_width() + 20, button_text.get_height() + 10)
             button["rect"] = button_rect
@@ -223,12 +306,12 @@ class App:
         
         # Draw keybinds below the buttons
         keybind_y = button_y + 20
-        keybind_title = self.small_font.render("Controls:", True, (200, 200, 200))
+        keybind_title = self.text.render(self.small_font, "Controls:", (200, 200, 200))
         self.screen.blit(keybind_title, (self.screen.get_width() // 2 - keybind_title.get_width() // 2, keybind_y))
         keybind_y += 15
         
         for keybind in self.menu_keybinds:
-            keybind_text = self.small_font.render(keybind, True, (255, 255, 255))
+            keybind_text = self.text.render(self.small_font, keybind, (255, 255, 255))
             self.screen.blit(keybind_text, (self.screen.get_width() // 2 - keybind_text.get_width() // 2, keybind_y))
             keybind_y += 12
     
@@ -268,9 +351,9 @@ class App:
     def credits_screen(self):
         """Draw the credits screen"""
         # Draw backdrop background instead of black fill
-        self.screen.blit(pygame.transform.scale(self.assets['backdrop'], self.screen.get_size()), (0, 0))
+        self.screen.blit(self.layers.backdrop, (0, 0))
         
-        credits_title = self.large_font.render("Credits", True, (255, 255, 255))
+        credits_title = self.text.render(self.large_font, "Credits", (255, 255, 255))
         title_x = self.screen.get_width() // 2 - credits_title.get_width() // 2
         self.screen.blit(credits_title, (title_x, 60))
         
@@ -286,66 +369,65 @@ class App:
         y = 120
         for line in credits_text:
             if line:
-                text = self.small_font.render(line, True, (255, 255, 255))
+                text = self.text.render(self.small_font, line, (255, 255, 255))
             else:
-                text = self.small_font.render(" ", True, (255, 255, 255))
+                text = self.text.render(self.small_font, " ", (255, 255, 255))
             self.screen.blit(text, (self.screen.get_width() // 2 - text.get_width() // 2, y))
             y += 15        
     
     def init_floating_clouds(self):
         """Initialize floating clouds at random positions and layers"""
-        for i in range(4):  # Create 8 floating clouds
+        for i in range(self.quality.limits['clouds'][1]):  # Create as many as quality allows at most
             cloud = {
-                'x': random.randint(0, self.screen.get_width() + 100),
-                'y': random.randint(-20, self.screen.get_height() + 50),
-                'speed': random.uniform(0.1, 0.6),  # speeeeeeeeeeeeeeeed
+                'x': rng.randint(0, self.screen.get_width() + 100),
+                'y': rng.randint(-20, self.screen.get_height() + 50),
+                'speed': rng.uniform(0.1, 0.6),  # speeeeeeeeeeeeeeeed
                 'layer': 'below',  # Only below layer
-                'alpha': random.randint(60, 90),  # Semi-transparent
-                'size': random.uniform(0.5, 1.5),  # Random size scaling
+                'alpha': rng.randint(60, 90),  # Semi-transparent
+                'size': rng.uniform(0.5, 1.5),  # Random size scaling
             }
+            self.make_cloud_img(cloud)
             self.floating_clouds.append(cloud)
     
     def update_floating_clouds(self, dt):
         """Update floating cloud positions"""
-        for cloud in self.floating_clouds:
+        for cloud in self.floating_clouds[:self.quality.get('clouds')]:
             # Move cloud from right to left
             cloud['x'] -= cloud['speed'] * dt
             
             # Reset cloud position when it goes off screen
             if cloud['x'] < -50:
-                cloud['x'] = self.screen.get_width() + random.randint(50, 150)
-                cloud['y'] = random.randint(-50, self.screen.get_height() + 50)
-                cloud['speed'] = random.uniform(0.1, 0.3)
-                cloud['alpha'] = random.randint(100, 100)
-                cloud['size'] = random.uniform(0.5, 1.5)
+                cloud['x'] = self.screen.get_width() + rng.randint(50, 150)
+                cloud['y'] = rng.randint(-50, self.screen.get_height() + 50)
+                cloud['speed'] = rng.uniform(0.1, 0.3)
+                cloud['alpha'] = rng.randint(100, 100)
+                cloud['size'] = rng.uniform(0.5, 1.5)
+                self.make_cloud_img(cloud)
+    
+    def make_cloud_img(self, cloud):
+        """Build a cloud's sprite once from its size & alpha, it's reused until the cloud respawns"""
+        cloud_img = self.assets["clouds_single"].copy()
+        
+        cloud_img.set_colorkey((0, 0, 0))  # Make black pixels transparent
+        
+        if cloud['size'] != 1.0:
+            new_size = (int(cloud_img.get_width() * cloud['size']), 
+                       int(cloud_img.get_height() * cloud['size']))
+            cloud_img = pygame.transform.scale(cloud_img, new_size)
+        
+        cloud_img.set_alpha(cloud['alpha'])
+        cloud['img'] = cloud_img
     
     def draw_floating_clouds(self, layer):
         """Draw floating clouds for specified layer ('below' or 'above')"""
-        for cloud in self.floating_clouds:
-            if cloud['layer'] == layer:
-  
-                cloud_img = self.assets["clouds_single"].copy()
-                
-                cloud_img.set_colorkey((0, 0, 0))  # Make black pixels transparent
-                
-                if cloud['size'] != 1.0:
-                    new_size = (int(cloud_img.get_width() * cloud['size']), 
-                               int(cloud_img.get_height() * cloud['size']))
-                    cloud_img = pygame.transform.scale(cloud_img, new_size)
-                
-                cloud_img.set_alpha(cloud['alpha'])
-                
-                # Draw cloud (no scroll offset for background elements)
-                self.screen.blit(cloud_img, (int(cloud['x']), int(cloud['y'])))
+        # Draw clouds (no scroll offset for background elements)
+        self.screen.blits([(cloud['img'], (int(cloud['x']), int(cloud['y']))) for cloud in self.floating_clouds[:self.quality.get('clouds')] if cloud['layer'] == layer], doreturn=False)
     
     
     def end_screen(self):
         """Draw the end screen with completion time and restart option"""
         # Paint the backdrop as background
-        self.screen.blit(pygame.transform.scale(self.assets['backdrop'], self.screen.get_size()), (0, 0))
-        
-        # Update transition timer
-        self.end_screen_transition_timer += self.dt / 60.0
+        self.screen.blit(self.layers.backdrop, (0, 0))
         
         # Calculate transition progress (0 to 1)
         transition_progress = min(self.end_screen_transition_timer / self.end_screen_transition_duration, 1.0)
@@ -353,10 +435,7 @@ class App:
         # Add progressive overlay for better text readability
         overlay_alpha = int(transition_progress * 80)  # Fade in overlay
         if overlay_alpha > 0:
-            overlay = pygame.Surface((self.screen.get_width(), self.screen.get_height()))
-            overlay.fill((0, 0, 0))
-            overlay.set_alpha(overlay_alpha)
-            self.screen.blit(overlay, (0, 0))
+            self.screen.blit(self.layers.overlay((0, 0, 0), overlay_alpha), (0, 0))
         
         # Only show text after some transition progress
         if transition_progress > 0.2:
@@ -364,7 +443,7 @@ class App:
             text_alpha_value = int(text_alpha * 255)
             
             # Title
-            title_text = self.large_font.render("Game Complete!", True, (0, 255, 0))
+            title_text = self.text.render(self.large_font, "Game Complete!", (0, 255, 0))
             title_text.set_alpha(text_alpha_value)
             title_x = (self.screen.get_width() - title_text.get_width()) // 2
             self.screen.blit(title_text, (title_x, self.screen.get_height() // 4))
@@ -374,7 +453,7 @@ class App:
             seconds = int(self.final_time % 60)
             millis = int((self.final_time % 1) * 1000)
             time_text = f"Final Time: {minutes:02d}:{seconds:02d}:{millis:02d}"
-            time_surface = self.large_font.render(time_text, True, (255, 255, 255))
+            time_surface = self.text.render(self.large_font, time_text, (255, 255, 255))
             time_surface.set_alpha(text_alpha_value)
             time_x = (self.screen.get_width() - time_surface.get_width()) // 2
             self.screen.blit(time_surface, (time_x, self.screen.get_height() // 2))
@@ -383,14 +462,14 @@ class App:
             if transition_progress > 0.6:
                 restart_alpha = min((transition_progress - 0.6) / 0.4, 1.0)
                 restart_alpha_value = int(restart_alpha * 255)
-                restart_text = self.large_font.render("Press ENTER to restart", True, (255, 255, 255))
+                restart_text = self.text.render(self.large_font, "Press ENTER to restart", (255, 255, 255))
                 restart_text.set_alpha(restart_alpha_value)
                 restart_x = (self.screen.get_width() - restart_text.get_width()) // 2
                 self.screen.blit(restart_text, (restart_x, self.screen.get_height() // 1.5))
             if transition_progress > 0.7:
                 restart_alpha = min((transition_progress - 0.7) / 0.3, 1.0)
                 restart_alpha_value = int(restart_alpha * 255)
-                restart_text = self.large_font.render("Press ENTER to restart", True, (255, 255, 255))
+                restart_text = self.text.render(self.large_font, "Press ENTER to restart", (255, 255, 255))
                 restart_text.set_alpha(restart_alpha_value)
                 restart_x = (self.screen.get_width() - restart_text.get_width()) // 2
                 self.screen.blit(restart_text, (restart_x, self.screen.get_height() // 1.5))
@@ -439,7 +518,7 @@ class App:
     def load_level(self, level_number):
         """Load a new level"""
         self.current_level = level_number
-        level_file = f"data/maps/{level_number}.json"
+        level_file = self.level_path(level_number)
         
         # Reset level start time for new level
         self.level_start_time = time.time()
@@ -447,15 +526,41 @@ class App:
         # Reset player position for new level
         self.player.pos = pygame.Vector2(50, 10)
         self.player.movement = pygame.Vector2(0, 0)
+        self.prev_player_pos = self.player.pos.copy()
         
-        # Load new level
-        self.tile_map = TileMap(self)
+        # Load new level, usually it's already been built in the background
         try:
-            self.tile_map.load(level_file)
+            self.tile_map = self.take_level(level_number, level_file)
         except FileNotFoundError:
             # If level doesn't exist, wrap around to level 0
             self.current_level = 0
-            self.tile_map.load("data/maps/0.json")
+            self.tile_map = TileMap(self)
+            self.tile_map.load(self.level_path(0))
+        self.prefetch_level(self.current_level + 1)
+
+    def level_path(self, level_number):
+        """Map file for a level, the binary one when it's been converted"""
+        path = f"data/maps/{level_number}{MAP_EXTENSION}"
+        return path if os.path.exists(path) else f"data/maps/{level_number}.json"
+
+    def prefetch_level(self, level_number):
+        """Start building a level in the background, ready for when the portal is reached"""
+        self.prefetch = None
+        if level_number < self.max_levels:
+            self.prefetch = LevelPrefetch(self, level_number, self.level_path(level_number))
+
+    def take_level(self, level_number, level_file):
+        """TileMap for a level, from the prefetch when there is one (finishing it if needed)"""
+        if self.prefetch and self.prefetch.level == level_number:
+            prefetch, self.prefetch = self.prefetch, None
+            try:
+                return prefetch.result()
+            except Exception as e:
+                # load it the blocking way, which either works or raises the way it always has
+                print(f"Building level {level_number} in the background failed ({e!r}), loading it now")
+        tile_map = TileMap(self)
+        tile_map.load(level_file)
+        return tile_map
     
     def draw_transition_overlay(self):
         """Draw the fade overlay during transitions"""
@@ -476,22 +581,22 @@ class App:
         
         # Create and draw white overlay
         if alpha > 0:
-            overlay = pygame.Surface((self.screen.get_width(), self.screen.get_height()))
-            overlay.fill((255, 255, 255))
-            overlay.set_alpha(alpha)
-            self.screen.blit(overlay, (0, 0))
+            self.screen.blit(self.layers.overlay((255, 255, 255), alpha), (0, 0))
     
 
     # put all the game stuff here
     def restart_game(self):
+        self.setup_game()
         self.current_level = 0
         self.player.pos = pygame.Vector2(50, 10)
         self.player.movement = pygame.Vector2(0, 0)
         self.player.falling = 30
+        self.prev_player_pos = self.player.pos.copy()
         self.transition_state = "none"
         self.transition_timer = 0.0
         self.tile_map = TileMap(self)
-        self.tile_map.load("data/maps/0.json")
+        self.tile_map.load(self.level_path(0))
+        self.prefetch_level(1)
         self.state = "game"
         # Reset timer - wait for first input to start
         self.game_running = False
@@ -503,9 +608,13 @@ class App:
 
     def reset_player_position(self):
         """Reset only the player position without changing level"""
+        if self.player is None:
+            # no game started yet
+            return
         self.player.pos = pygame.Vector2(50, 10)
         self.player.movement = pygame.Vector2(0, 0)
         self.player.falling = 30
+        self.prev_player_pos = self.player.pos.copy()
     
     def draw_timer(self):
         """Draw current level timer on top left"""
@@ -524,7 +633,7 @@ class App:
                 timer_text = "00:00.00"
                 timer_color = (157, 67, 67)  # Red when timer hasn't started
             
-            timer_surface = self.small_font.render(timer_text, True, timer_color)
+            timer_surface = self.text.render(self.small_font, timer_text, timer_color)
             self.screen.blit(timer_surface, (8, 8))  # Top left corner
     
     def draw_level_counter(self):
@@ -532,15 +641,17 @@ class App:
         if self.state == "game":
             level_text = f"Level: {self.current_level + 1}"  # Display as 1-based instead of 0-based
             
-            level_surface = self.small_font.render(level_text, True, (255, 255, 255))
+            level_surface = self.text.render(self.small_font, level_text, (255, 255, 255))
             # Position on top right
             x_pos = self.screen.get_width() - level_surface.get_width() - 8
             self.screen.blit(level_surface, (x_pos, 8))
 
     def update(self):
-        # Always update long press reset regardless of pause state
-        self.update_long_press_reset()
-        
+        """Advance the game by one fixed tick of self.dt frames"""
+        # remember where things were, so rendering can interpolate towards this tick
+        self.prev_scroll = self.scroll.copy()
+        self.prev_player_pos = self.player.pos.copy()
+
         # Always update transitions (whether paused or not)
         # Pass seconds to transition updater for consistent fade timing
         self.update_transition(self.dt / 60.0)
@@ -553,12 +664,16 @@ class App:
             # Only update game logic if not transitioning and not paused
             if self.transition_state == "none":
                 # Update tile destruction timers
+                t = time.perf_counter()
                 self.tile_map.update(self.dt / 60.0)  # Convert dt to seconds
+                self.profiler.add('tiles.update', t)
                 
                 # Update floating clouds
                 self.update_floating_clouds(self.dt)
                 
+                t = time.perf_counter()
                 self.player.update(self.dt, self.tile_map)
+                self.profiler.add('player', t)
                 
                 # Check if player has fallen too far (restart game)
                 if self.player.pos.y > self.fall_threshold:
@@ -571,45 +686,53 @@ class App:
                     return
                 
                 # Check for portal collision
+                t = time.perf_counter()
                 self.check_portal_collision()
+                self.profiler.add('portal', t)
 
-        # Always update camera and rendering
+        # Always update camera
         self.scroll.x += (self.player.pos.x - self.screen.get_width() / 2 - self.scroll.x) * 0.1 * self.dt
         self.scroll.y += (self.player.pos.y - self.screen.get_height() / 2 - self.scroll.y) * 0.05 * self.dt
 
         self.screen_shake = max(0, self.screen_shake - 1 * self.dt)
+
+        # Only update particles if not paused
+        if not self.game_paused:
+            self.update_particles()
+
+    def render(self, alpha=1.0):
+        """Draw the game, alpha is how far we are between the last tick and the next one (0 to 1)"""
+        # interpolate camera & player between the last two ticks
+        scroll = self.prev_scroll.lerp(self.scroll, alpha)
+        player_pos = self.prev_player_pos.lerp(self.player.pos, alpha)
+
+        # the shake is cosmetic, so it stays off the session rng (frame rate would change the simulation otherwise)
         screen_shake_offset = (random.random() * self.screen_shake - self.screen_shake / 2, random.random() * self.screen_shake - self.screen_shake / 2)
-        render_scroll = (int(self.scroll.x + screen_shake_offset[0]), int(self.scroll.y + screen_shake_offset[1]))
-        self.screen.blit(pygame.transform.scale(self.assets['backdrop'], self.screen.get_size()), (0, 0))
+        if not self.quality.get('screen_shake'):
+            screen_shake_offset = (0, 0)
+        render_scroll = (int(scroll.x + screen_shake_offset[0]), int(scroll.y + screen_shake_offset[1]))
+        self.screen.blit(self.layers.backdrop, (0, 0))
         
         # Draw clouds below the level (pause-aware)
         self.draw_floating_clouds('below')
         
+        t = time.perf_counter()
         self.tile_map.draw(self.screen, render_scroll)
+        self.profiler.add('tiles.draw', t)
 
-        # Only update particles if not paused
         if not self.game_paused:
-            self.update_kickup(render_scroll)
-            self.update_sparks(render_scroll)
-            for i, bit in sorted(enumerate(self.smoke), reverse=True):
-                bit.update(self.dt)
-                if bit.timer > SMOKE_DELAY // FADE:
-                    self.smoke.pop(i)
-                bit.draw(self.screen, render_scroll)
-            self.update_fire(render_scroll)
+            self.draw_particles(render_scroll)
         else:
             # Draw particles without updating when paused
             for bit in self.smoke:
                 bit.draw(self.screen, render_scroll)
             # Draw static fire
-            for f in self.fire:
-                if f[1] < len(self.assets['fire']):
-                    fire_img = self.assets['fire'][int(f[1])]
-                    self.screen.blit(fire_img, (f[0][0] - render_scroll[0], f[0][1] - render_scroll[1]))
+            self.fire.draw(self.screen, render_scroll)
             # Kickup and sparks are just dots/pixels, skip rendering when paused for simplicity
 
-        self.player.draw(self.screen, render_scroll)
+        self.player.draw(self.screen, render_scroll, player_pos)
         
+        t = time.perf_counter()
         # Draw transition overlay
         self.draw_transition_overlay()
         
@@ -630,6 +753,7 @@ class App:
         
         # Draw reset progress bar if K is being held
         self.draw_reset_progress()
+        self.profiler.add('hud', t)
         
         # Capture screen if needed (after all rendering is complete)
         if hasattr(self, 'capture_next_frame') and self.capture_next_frame:
@@ -638,13 +762,14 @@ class App:
             self.state = "end_screen"
     
     def find_portal_position(self):
-        """Find the position of the portal tile in the current level"""
-        for tile_loc, tile in self.tile_map.tile_map.items():
-            if tile['type'] == 'portal':
-                # Return the center position of the portal tile
-                tile_x = tile['pos'][0] * self.tile_map.tile_size + self.tile_map.tile_size // 2
-                tile_y = tile['pos'][1] * self.tile_map.tile_size + self.tile_map.tile_size // 2
-                return pygame.Vector2(tile_x, tile_y)
+        """Find the position of the nearest portal tile in the current level"""
+        player_center = self.player.get_rect().center
+        portal = self.tile_map.nearest('portal', player_center)
+        if portal:
+            # Return the center position of the portal tile
+            tile_x = portal[0] * self.tile_map.tile_size + self.tile_map.tile_size // 2
+            tile_y = portal[1] * self.tile_map.tile_size + self.tile_map.tile_size // 2
+            return pygame.Vector2(tile_x, tile_y)
         return None
     
     def draw_portal_progress_bar(self):
@@ -724,27 +849,27 @@ class App:
         player_rect = self.player.get_rect()
         player_center = (player_rect.centerx, player_rect.centery)
         
-        # Check tiles around player for portals
-        tiles_around = self.tile_map.tiles_around(player_center)
-        for tile in tiles_around:
-            if tile['type'] == 'portal':
-                # Record current level time before transitioning
-                if self.game_running and hasattr(self, 'level_start_time'):
-                    current_level_time = time.time() - self.level_start_time - self.total_pause_time
-                    self.level_times.append(current_level_time)
-                
-                # Check if this is the final level
-                if self.current_level >= self.max_levels - 1:
-                    # Game completed! Store final time first
-                    if self.game_running:
-                        self.final_time = time.time() - self.game_start_time
-                        self.game_running = False
-                    # Flag to capture screen at the end of update
-                    self.capture_next_frame = True
-                else:
-                    # Player touched portal, start transition to next level
-                    next_level = self.current_level + 1
-                    self.start_level_transition(next_level)
+        # Check the 3x3 tiles around player for portals
+        tile_size = self.tile_map.tile_size
+        around = pygame.Rect((player_center[0] // tile_size - 1) * tile_size, (player_center[1] // tile_size - 1) * tile_size, tile_size * 3, tile_size * 3)
+        for portal in self.tile_map.tiles_in_rect(around, {'portal'}):
+            # Record current level time before transitioning
+            if self.game_running and hasattr(self, 'level_start_time'):
+                current_level_time = time.time() - self.level_start_time - self.total_pause_time
+                self.level_times.append(current_level_time)
+            
+            # Check if this is the final level
+            if self.current_level >= self.max_levels - 1:
+                # Game completed! Store final time first
+                if self.game_running:
+                    self.final_time = time.time() - self.game_start_time
+                    self.game_running = False
+                # Flag to capture screen at the end of update
+                self.capture_next_frame = True
+            else:
+                # Player touched portal, start transition to next level
+                next_level = self.current_level + 1
+                self.start_level_transition(next_level)
     def check_if_first_input(self):
         """Check if this is the first input to start the game timer"""
         if self.isFirstInput:
@@ -781,7 +906,7 @@ class App:
         line_height = 12
         
         # Draw title
-        title_text = self.small_font.render("LEVEL TIMES", True, (255, 255, 255))
+        title_text = self.text.render(self.small_font, "LEVEL TIMES", (255, 255, 255))
         self.screen.blit(title_text, (start_x, start_y))
         y_pos = start_y + line_height + 5
         
@@ -792,7 +917,7 @@ class App:
             level_millis = int((level_time % 1) * 1000)
             
             level_text = f"L{i+1}: {level_minutes:02d}:{level_seconds:02d}.{level_millis//10:02d}"
-            level_surface = self.small_font.render(level_text, True, (200, 200, 200))
+            level_surface = self.text.render(self.small_font, level_text, (200, 200, 200))
             self.screen.blit(level_surface, (start_x, y_pos))
             y_pos += line_height
         
@@ -804,7 +929,7 @@ class App:
             current_millis = int((current_level_time % 1) * 1000)
             
             current_text = f"Now: {current_minutes:02d}:{current_seconds:02d}.{current_millis//10:02d}"
-            current_surface = self.small_font.render(current_text, True, (100, 255, 100))
+            current_surface = self.text.render(self.small_font, current_text, (100, 255, 100))
             self.screen.blit(current_surface, (start_x, y_pos))
             y_pos += line_height + 3
         elif self.game_running and hasattr(self, 'level_start_time') and self.game_paused:
@@ -815,7 +940,7 @@ class App:
             current_millis = int((current_level_time % 1) * 1000)
             
             current_text = f"Now: {current_minutes:02d}:{current_seconds:02d}.{current_millis//10:02d} [PAUSED]"
-            current_surface = self.small_font.render(current_text, True, (255, 255, 100))
+            current_surface = self.text.render(self.small_font, current_text, (255, 255, 100))
             self.screen.blit(current_surface, (start_x, y_pos))
             y_pos += line_height + 3
         
@@ -825,7 +950,7 @@ class App:
             total_seconds = int(total_time % 60)
             total_millis = int((total_time % 1) * 1000)
             total_text = f"Total: {total_minutes:02d}:{total_seconds:02d}.{total_millis//10:02d}"
-            total_surface = self.small_font.render(total_text, True, (255, 255, 100))
+            total_surface = self.text.render(self.small_font, total_text, (255, 255, 100))
             self.screen.blit(total_surface, (start_x, y_pos))
 
     def toggle_pause(self):
@@ -848,13 +973,10 @@ class App:
             return
             
         # Create semi-transparent overlay
-        overlay = pygame.Surface((self.screen.get_width(), self.screen.get_height()))
-        overlay.fill((0, 0, 0))
-        overlay.set_alpha(150)
-        self.screen.blit(overlay, (0, 0))
+        self.screen.blit(self.layers.overlay((0, 0, 0), 150), (0, 0))
         
         # Draw pause text
-        pause_text = self.large_font.render("PAUSED", True, (255, 255, 255))
+        pause_text = self.text.render(self.large_font, "PAUSED", (255, 255, 255))
         pause_x = (self.screen.get_width() - pause_text.get_width()) // 2
         pause_y = (self.screen.get_height() - pause_text.get_height()) // 2 - 20
         self.screen.blit(pause_text, (pause_x, pause_y))
@@ -869,7 +991,7 @@ class App:
         
         y_offset = pause_y + 40
         for instruction in instructions:
-            instruction_surface = self.small_font.render(instruction, True, (200, 200, 200))
+            instruction_surface = self.text.render(self.small_font, instruction, (200, 200, 200))
             instruction_x = (self.screen.get_width() - instruction_surface.get_width()) // 2
             self.screen.blit(instruction_surface, (instruction_x, y_offset))
             y_offset += 18
@@ -887,7 +1009,7 @@ class App:
                 # Check if held long enough
                 hold_time = time.time() - self.reset_key_start_time
                 if hold_time >= self.reset_hold_duration:
-                    self.restart_game()
+                    self.actions.append('restart')
                     self.reset_key_pressed = False
         else:
             # Key released, reset tracking
@@ -918,11 +1040,110 @@ class App:
             pygame.draw.rect(self.screen, color, (bar_x, bar_y, fill_width, bar_height))
         
         # Label
-        reset_text = self.small_font.render("Hold K to Reset", True, (255, 255, 255))
+        reset_text = self.text.render(self.small_font, "Hold K to Reset", (255, 255, 255))
         reset_x = (self.screen.get_width() - reset_text.get_width()) // 2
         self.screen.blit(reset_text, (reset_x, bar_y - 20))
 
 
+    def start_session(self, seed=None, level=0):
+        """Start a fresh game with the session rng seeded, returns the seed"""
+        if seed is None:
+            seed = random.getrandbits(63)
+        rng.seed(seed)
+        self.floating_clouds = []
+        self.init_floating_clouds()
+        self.frames_since_start = 0
+        self.restart_game()
+        if level:
+            self.load_level(level)
+        return seed
+
+    def start_recording(self, seed=None, level=0):
+        """Start a fresh game and record every tick's input until save_recording()"""
+        seed = self.start_session(seed, level)
+        self.recorder = Recorder(seed, self.tick_rate, level)
+
+    def save_recording(self, path):
+        if self.recorder is not None:
+            self.recorder.save(path)
+
+    def start_replay(self, path):
+        """Start a fresh game that plays back a recording instead of reading the keyboard"""
+        self.replay = Replay(path)
+        self.replay_tick = 0
+        self.tick_rate = self.replay.tick_rate
+        self.start_session(self.replay.seed, self.replay.level)
+
+    def apply_action(self, action):
+        if action == 'start':
+            self.check_if_first_input()
+        elif action == 'restart':
+            self.restart_game()
+        elif action == 'pause':
+            self.toggle_pause()
+        elif action == 'reset':
+            self.reset_player_position()
+
+    def tick(self):
+        """One fixed simulation step for the current state"""
+        if self.replay is not None:
+            if self.replay_tick < len(self.replay):
+                # the recording replaces whatever the keyboard did this tick
+                controls, self.actions, self.dt, self.quality.level = self.replay[self.replay_tick]
+                self.player.controls.update(controls)
+                self.replay_tick += 1
+            else:
+                # finished, hand control back to the player
+                self.replay = None
+        elif self.recorder is not None:
+            self.recorder.record(self.player.controls, self.actions, self.dt, self.quality.level)
+        for action in self.actions:
+            self.apply_action(action)
+        self.actions = []
+
+        if self.state == "game":
+            self.update()
+        elif self.state == "end_screen":
+            # Update transition timer
+            self.end_screen_transition_timer += self.dt / 60.0
+
+    def draw(self, alpha=1.0):
+        """Draw the current state to self.screen"""
+        if self.state == "menu":
+            self.menu()
+        elif self.state == "game":
+            # draw game
+            self.render(alpha)
+        elif self.state == "end_screen":
+            self.end_screen()
+        elif self.state == "credits":
+            self.credits_screen()
+        if self.profiler.visible:
+            self.profiler.draw(self.screen, self.small_font, self.text)
+
+    def end_frame(self):
+        """Close off the profiler's frame with the live counts (and the startup trace after the first one)"""
+        if 'first frame' not in self.startup.phases:
+            self.startup.mark('first frame')
+            if self.show_startup:
+                print('\n'.join(self.startup.lines()), file=sys.stderr)
+        self.profiler.count('particles', len(self.kickup) + len(self.sparks) + (len(self.fire) if self.fire is not None else 0))
+        self.profiler.count('smoke', len(self.smoke))
+        self.profiler.count('visible tiles', self.tile_map.visible)
+        self.profiler.end_frame()
+
+    def present(self):
+        """Scale self.screen up to the window and show it"""
+        if WEB_PLATFORM:
+            pygame.display.set_caption(f"FPS: {self.clock.get_fps() :.1f}")
+        else:
+            pygame.display.set_caption(f"FPS: {self.clock.get_fps() :.1f} Display: {self.screen.get_width()} * {self.screen.get_height()}")
+        # scale display
+        t = time.perf_counter()
+        self.display.blit(pygame.transform.scale_by(self.screen, SCALE), (0, 0))
+        pygame.display.flip()
+        self.profiler.add('present', t)
+
     # asynchronous main loop to run in browser
     async def run(self):
         pygame.mixer.music.play(-1)
@@ -932,6 +1153,8 @@ class App:
                     return
                 if event.type == pygame.WINDOWRESIZED:
                     self.screen = pygame.Surface((self.display.get_width() // SCALE, self.display.get_height() // SCALE))
+                    if self.backdrop_layers is not None:
+                        self.backdrop_layers.resize(self.screen.get_size())
                 
                 # Handle menu input
                 if self.state == "menu":
@@ -943,33 +1166,42 @@ class App:
                 if event.type == pygame.KEYDOWN:
                     if event.key == pygame.K_RETURN:
                         if self.state == "end_screen":
-                            self.restart_game()
+                            self.actions.append('restart')
                         elif self.state == "game":
-                            self.restart_game()
+                            self.actions.append('restart')
                     # Remove immediate K key restart - now handled by long press
                     if event.key == pygame.K_p:
-                        self.toggle_pause()
+                        self.actions.append('pause')
                     if event.key == pygame.K_r:
-                        self.reset_player_position()
+                        self.actions.append('reset')
                     if event.key == pygame.K_l:
                         self.toggle_lap_view()
+                    if event.key == pygame.K_F3:
+                        self.profiler.visible = not self.profiler.visible
+                    if event.key == pygame.K_F4:
+                        path = f"profile_{time.strftime('%Y%m%d_%H%M%S')}.csv"
+                        self.profiler.dump_csv(path)
+                        print(f"Wrote frame timings to {path}")
                     if event.key == pygame.K_ESCAPE:
                         print('Game Quitted')
                         return 
+                    # the rest move the player, who doesn't exist until a game starts
+                    if self.player is None:
+                        continue
                     if event.key == pygame.K_SPACE or event.key == pygame.K_UP or event.key == pygame.K_w or event.key == pygame.K_BACKSPACE:
                         self.player.jumping = 0
                         self.player.controls['up'] = True
-                        self.check_if_first_input()
+                        self.actions.append('start')
                     if event.key == pygame.K_DOWN or event.key == pygame.K_s:
                         self.player.controls['down'] = True
-                        self.check_if_first_input()
+                        self.actions.append('start')
                     if event.key == pygame.K_LEFT or event.key == pygame.K_a:
                         self.player.controls['left'] = True
-                        self.check_if_first_input()
+                        self.actions.append('start')
                     if event.key == pygame.K_RIGHT or event.key == pygame.K_d:
                         self.player.controls['right'] = True
-                        self.check_if_first_input()
-                elif event.type == pygame.KEYUP:
+                        self.actions.append('start')
+                elif event.type == pygame.KEYUP and self.player is not None:
                     if event.key == pygame.K_SPACE or event.key == pygame.K_UP or event.key == pygame.K_w or event.key == pygame.K_BACKSPACE:
                         self.player.controls['up'] = False
                     if event.key == pygame.K_DOWN or event.key == pygame.K_s:
@@ -979,42 +1211,163 @@ class App:
                     if event.key == pygame.K_RIGHT or event.key == pygame.K_d:
                         self.player.controls['right'] = False
             
-            # update delta time
-            self.dt = (time.time() - self.last_time) * 60
-            self.last_time = time.time()
-
-            if self.state == "menu":
-                self.menu()
-            elif self.state == "game":
-                # update game
-                self.update()
-            elif self.state == "end_screen":
-                self.end_screen()
-            elif self.state == "credits":
-                self.credits_screen()
+            # Always update long press reset regardless of pause state
+            if self.state == "game":
+                self.update_long_press_reset()
+
+            # run as many fixed ticks as the real time since last frame covers
+            now = time.time()
+            self.accumulator += now - self.last_time
+            self.last_time = now
+            tick_time = 1 / self.tick_rate
+            self.dt = 60 / self.tick_rate
+            ticks = 0
+            while self.accumulator >= tick_time and ticks < MAX_TICKS_PER_FRAME:
+                self.tick()
+                self.accumulator -= tick_time
+                ticks += 1
+            if ticks == MAX_TICKS_PER_FRAME:
+                # too far behind (tab refocus, gc pause...), drop the backlog instead of spiralling
+                self.accumulator = min(self.accumulator, tick_time)
+            if self.prefetch:
+                self.prefetch.step()
+            self.assets.step()
+
+            self.draw(self.accumulator / tick_time)
             # check if tab is focused if running through web (avoid messing up dt and stuff)
             if WEB_PLATFORM:
                 self.active = not js.document.hidden
 
             # check if page is active
             if self.active:
-                if WEB_PLATFORM:
-                    pygame.display.set_caption(f"FPS: {self.clock.get_fps() :.1f}")
-                else:
-                    pygame.display.set_caption(f"FPS: {self.clock.get_fps() :.1f} Display: {self.screen.get_width()} * {self.screen.get_height()}")
-                # scale display
-                self.display.blit(pygame.transform.scale_by(self.screen, SCALE), (0, 0))
-                pygame.display.flip()
+                self.present()
             else:
                 pygame.display.set_caption("IDLE")
+            self.end_frame()
 
             await asyncio.sleep(0) # keep this for pygbag to work
             self.clock.tick(60) # don't really need more than 60 fps
+            # time spent on the frame itself, without the wait for the frame cap
+            if self.active:
+                self.quality.update(self.clock.get_rawtime())
 
 # run App() asynchronously so it works with pygbag
-async def main():
-    app = App()
+async def main(record=None, replay=None, seed=None, level=0, startup=None, show_startup=False):
+    app = App(startup)
+    app.show_startup = show_startup
+    if replay:
+        app.start_replay(replay)
+    elif record:
+        app.start_recording(seed, level)
     await app.run()
+    if record:
+        app.save_recording(record)
+
+def run_headless(frames=600, level=0, until_complete=False, profile=None, seed=None, replay=None, timings=None, startup=None):
+    """Simulate & draw frames as fast as possible without a window, returns a summary dict"""
+    app = App(startup)
+    if replay:
+        # a recording plays out in full, from its own seed & level
+        app.start_replay(replay)
+        frames = len(app.replay)
+        level = app.replay.level
+        seed = app.replay.seed
+    else:
+        seed = app.start_session(seed, level)
+    if timings:
+        # keep every frame rather than just the last few seconds
+        app.profiler = Profiler(frames=max(1, frames))
+
+    # seconds spent in each part of the frame
+    phases = {'update': 0.0, 'render': 0.0, 'present': 0.0}
+    profiler = None
+    if profile:
+        import cProfile
+        profiler = cProfile.Profile()
+    completed = False
+    simulated = 0
+
+    if profiler:
+        profiler.enable()
+    start = time.perf_counter()
+    while simulated < frames:
+        pygame.event.pump()
+        t = time.perf_counter()
+        app.tick()
+        if app.prefetch:
+            app.prefetch.step()
+        app.assets.step()
+        phases['update'] += time.perf_counter() - t
+        t = time.perf_counter()
+        app.draw()
+        phases['render'] += time.perf_counter() - t
+        t = time.perf_counter()
+        app.present()
+        phases['present'] += time.perf_counter() - t
+        app.end_frame()
+        simulated += 1
+        # touching a portal starts a transition (or the end screen on the last level)
+        if until_complete and (app.transition_state != "none" or app.capture_next_frame or app.state == "end_screen"):
+            completed = True
+            break
+    wall_time = time.perf_counter() - start
+    if profiler:
+        profiler.disable()
+        profiler.dump_stats(profile)
+    if timings:
+        app.profiler.dump_csv(timings)
+
+    return {
+        'frames': simulated,
+        'level': level,
+        'seed': seed,
+        'final_level': app.current_level,
+        'player_pos': [app.player.pos.x, app.player.pos.y],
+        'completed': completed,
+        'wall_time': wall_time,
+        'fps': simulated / wall_time if wall_time else 0.0,
+        'phases': {name: {'total': total, 'per_frame_ms': total / max(1, simulated) * 1000} for name, total in phases.items()},
+        'asset_load_ms': dict(app.assets.report()),
+        'startup_ms': dict(app.startup.phases, total=app.startup.total()),
+    }
+
+def cli(argv=None):
+    """Command line entry point, runs the game (or a headless run) and returns the exit code"""
+    startup = StartupTrace(IMPORT_START)
+    startup.mark('import')
+    parser = argparse.ArgumentParser(description="System of a Cloud")
+    parser.add_argument('--headless', action='store_true', help="run without a window and print a json summary")
+    parser.add_argument('--frames', type=int, default=600, help="most frames to simulate (headless)")
+    parser.add_argument('--level', type=int, default=0)
+    parser.add_argument('--until-complete', action='store_true', help="stop once the level is completed (headless)")
+    parser.add_argument('--profile', help="write cProfile stats (pstats) to this file (headless)")
+    parser.add_argument('--timings', help="write per-phase frame timings (csv) to this file (headless)")
+    parser.add_argument('--seed', type=int, help="seed for the session rng")
+    parser.add_argument('--record', help="record your input to this file, saved on quit")
+    parser.add_argument('--replay', help="play back a recording")
+    parser.add_argument('--startup-trace', action='store_true', help="print how long each part of starting up took")
+    parser.add_argument('--startup-budget', type=float, nargs='?', const=FIRST_FRAME_BUDGET,
+                        help=f"fail if the first frame takes longer than this many ms (default {FIRST_FRAME_BUDGET}, headless)")
+    args = parser.parse_args(argv)
+    if not args.headless:
+        asyncio.run(main(args.record, args.replay, args.seed, args.level, startup, args.startup_trace))
+        return 0
+
+    summary = run_headless(args.frames, args.level, args.until_complete, args.profile, args.seed, args.replay, args.timings, startup)
+    print(json.dumps(summary, indent=2))
+    if args.startup_trace:
+        print('\n'.join(startup.lines()), file=sys.stderr)
+    if args.startup_budget is not None and startup.total() > args.startup_budget:
+        print(f"first frame took {startup.total():.1f} ms, over the {args.startup_budget:.0f} ms budget", file=sys.stderr)
+        return 1
+    return 0
 
 # start
-asyncio.run(main())
+if __name__ == "__main__":
+    if WEB_PLATFORM:
+        # pygbag's asyncio.run doesn't block and nothing may follow it (least of all sys.exit)
+        startup = StartupTrace(IMPORT_START)
+        startup.mark('import')
+        asyncio.run(main(startup=startup))
+    else:
+        sys.exit(cli())
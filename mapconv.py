@@ -0,0 +1,40 @@
+import os, sys, json, argparse
+from itertools import compress
+
+os.environ['PYGAME_HIDE_SUPPORT_PROMPT'] = '1'
+
+from src.util import read_json
+from src.tiles import AUTO_TILE_TYPES
+from src.mapfile import is_map_file, level_planes, write_map, load_level, AUTO_TILED
+from mapgen import auto_tile_variant
+
+def is_auto_tiled(names, types, variants, width, height):
+    """True if every auto-tiled cell already holds the variant the game would give it"""
+    auto = {tid for tid, name in enumerate(names) if name in AUTO_TILE_TYPES}
+    for i in compress(range(len(types)), types):
+        tid = types[i]
+        if tid in auto and variants[i] != auto_tile_variant(types, auto, width, height, i % width, i // width):
+            return False
+    return True
+
+def json_to_map(src, dst):
+    level = read_json(src)['level']
+    origin, width, height, names, types, variants = level_planes(level)
+    # maps that are already tiled skip tiling when loaded
+    flags = AUTO_TILED if is_auto_tiled(names, types, variants, width, height) else 0
+    write_map(dst, origin, width, height, names, types, variants, level['off_grid'], flags)
+
+def map_to_json(src, dst):
+    with open(dst, 'w') as f:
+        json.dump({'level': load_level(src)}, f, separators=(',', ':'))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert maps between the editor's json and the binary .map format")
+    parser.add_argument('src')
+    parser.add_argument('dst')
+    args = parser.parse_args()
+    if is_map_file(args.src):
+        map_to_json(args.src, args.dst)
+    else:
+        json_to_map(args.src, args.dst)
+    print(f"{args.src} ({os.path.getsize(args.src)} bytes) -> {args.dst} ({os.path.getsize(args.dst)} bytes)", file=sys.stderr)
@@ -0,0 +1,123 @@
+import os, sys, json, random, argparse
+
+# only the auto-tile tables are needed from the game, keep pygame quiet about being imported
+os.environ['PYGAME_HIDE_SUPPORT_PROMPT'] = '1'
+
+from src.tiles import AUTO_TILE_TYPES, AUTO_TILE_BITS
+
+# defaults roughly follow the shipped maps: mostly clouds, some rock & moss, a bit of decor
+WIDTH, HEIGHT = 180, 180
+DENSITY = 0.3
+# solid (non destructible) tile types and how often each one is picked
+MIX = {'rock': 3, 'moss': 1, 'grass': 1}
+# fraction of platforms made of destructible clouds
+CLOUD_RATIO = 0.6
+# average platform length in tiles
+PLATFORM = 6
+# area (tiles) per off-grid large_decor when no count is given
+DECOR_AREA = 2000
+LARGE_DECOR_VARIANTS = 6
+# the player spawns around tile (6, 1), this many tiles across stay clear above a solid floor
+START_WIDTH = 16
+START_FLOOR = 4
+# tiles written per chunk of json
+ROWS_PER_WRITE = 64
+
+def parse_mix(text):
+    """"rock=3,moss=1" -> {'rock': 3.0, 'moss': 1.0}"""
+    mix = {}
+    for part in text.split(','):
+        name, _, weight = part.partition('=')
+        mix[name.strip()] = float(weight or 1)
+    return mix
+
+def generate(width=WIDTH, height=HEIGHT, density=DENSITY, mix=MIX, cloud_ratio=CLOUD_RATIO, decor=None, platform=PLATFORM, seed=0):
+    """Lay out a map, returns (type names, flat bytearray of indices into them, off-grid tiles)"""
+    gen = random.Random(seed)
+    names = [''] + ['cloud'] + list(mix) + ['portal']
+    cloud, portal = 1, len(names) - 1
+    solids = list(range(2, portal))
+    weights = list(mix.values())
+    cells = bytearray(width * height)
+
+    # rows of platforms, the gaps between them sized so the fill comes out at density on average
+    density = min(max(density, 0.0), 1.0)
+    if density:
+        gap = platform * (1 - density) / density
+        for y in range(height):
+            row = y * width
+            # start each row part way into a gap so the platforms don't line up
+            x = round(gen.uniform(0, gap))
+            while x < width:
+                length = max(1, round(gen.expovariate(1 / platform)))
+                tid = cloud if gen.random() < cloud_ratio or not solids else gen.choices(solids, weights)[0]
+                end = min(width, x + length)
+                cells[row + x:row + end] = bytes([tid]) * (end - x)
+                x = end + round(gen.expovariate(1 / gap)) if gap else end
+
+    # somewhere to land at the spawn, and a portal to reach on the far side
+    start = min(START_WIDTH, width)
+    for y in range(min(START_FLOOR, height)):
+        cells[y * width:y * width + start] = bytes(start)
+    if START_FLOOR < height:
+        floor = solids[0] if solids else cloud
+        cells[START_FLOOR * width:START_FLOOR * width + start] = bytes([floor]) * start
+    if width > 1 and height > 1:
+        cells[(height - 2) * width + width - 2] = portal
+
+    if decor is None:
+        decor = width * height // DECOR_AREA
+    off_grid = [{'pos': [gen.randint(0, width * 8), gen.randint(0, height * 8)], 'type': 'large_decor', 'variant': gen.randrange(LARGE_DECOR_VARIANTS)} for _ in range(decor)]
+    return names, cells, off_grid
+
+def auto_tile_variant(cells, auto, width, height, x, y):
+    i = y * width + x
+    left = x > 0 and cells[i - 1] in auto
+    up = y > 0 and cells[i - width] in auto
+    right = x < width - 1 and cells[i + 1] in auto
+    down = y < height - 1 and cells[i + width] in auto
+    return AUTO_TILE_BITS[left << 3 | up << 2 | right << 1 | down]
+
+def write_level(path, width, height, names, cells, off_grid):
+    """Stream a generated map out as level_editor.py json, returns the number of tiles written"""
+    auto = {tid for tid, name in enumerate(names) if name in AUTO_TILE_TYPES}
+    written = 0
+    with open(path, 'w') as f:
+        f.write('{"level":{"tiles":[')
+        parts = []
+        for y in range(height):
+            row = y * width
+            for x in range(width):
+                tid = cells[row + x]
+                if tid:
+                    variant = auto_tile_variant(cells, auto, width, height, x, y) if tid in auto else 0
+                    parts.append(f'{{"pos":[{x},{y}],"type":"{names[tid]}","variant":{variant}}}')
+            if y % ROWS_PER_WRITE == ROWS_PER_WRITE - 1 or y == height - 1:
+                if parts:
+                    f.write((',' if written else '') + ','.join(parts))
+                    written += len(parts)
+                    parts = []
+        f.write('],"off_grid":')
+        json.dump(off_grid, f, separators=(',', ':'))
+        f.write('}}')
+    return written
+
+def generate_map(path, width=WIDTH, height=HEIGHT, **options):
+    """Generate a map straight to path, options are passed on to generate()"""
+    names, cells, off_grid = generate(width, height, **options)
+    return write_level(path, width, height, names, cells, off_grid)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a random map in the level editor's json format")
+    parser.add_argument('out')
+    parser.add_argument('--width', type=int, default=WIDTH, help="tiles across")
+    parser.add_argument('--height', type=int, default=HEIGHT, help="tiles down")
+    parser.add_argument('--density', type=float, default=DENSITY, help="fraction of cells holding a tile")
+    parser.add_argument('--mix', type=parse_mix, default=MIX, help="solid tile weights, e.g. rock=3,moss=1,grass=1")
+    parser.add_argument('--clouds', type=float, default=CLOUD_RATIO, help="fraction of platforms made of destructible clouds")
+    parser.add_argument('--decor', type=int, help="off-grid large decor count")
+    parser.add_argument('--platform', type=float, default=PLATFORM, help="average platform length")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    count = generate_map(args.out, args.width, args.height, density=args.density, mix=args.mix, cloud_ratio=args.clouds, decor=args.decor, platform=args.platform, seed=args.seed)
+    print(f"wrote {count} tiles to {args.out}", file=sys.stderr)
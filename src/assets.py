@@ -0,0 +1,84 @@
+import time
+
+# ms per frame spent preloading, one asset always gets loaded even if it takes longer
+PRELOAD_BUDGET = 2
+
+class Assets:
+    """The app's assets dict, but each entry is only loaded the first time it's used (or preloaded)"""
+    def __init__(self):
+        # name -> (key, loader, args), key is the name itself or the group it's loaded with
+        self.sources = {}
+        self.loaded = {}
+        # key -> ms its loader took
+        self.load_times = {}
+        # names waiting to be loaded by step()
+        self.pending = []
+
+    def add(self, name, loader, *args):
+        """Register loader(*args) as the way to load name"""
+        self.sources[name] = (name, loader, args)
+
+    def add_group(self, group, names, loader, *args):
+        """Register names that one loader call loads together, loader(*args) returns {name: asset}"""
+        for name in names:
+            self.sources[name] = (group, loader, args)
+
+    def load(self, name):
+        if name not in self.loaded:
+            key, loader, args = self.sources[name]
+            start = time.perf_counter()
+            value = loader(*args)
+            self.load_times[key] = (time.perf_counter() - start) * 1000
+            if key == name:
+                self.loaded[name] = value
+            else:
+                self.loaded.update(value)
+        return self.loaded[name]
+
+    def preload(self, names):
+        """Load names right away"""
+        for name in names:
+            self.load(name)
+
+    def preload_later(self, names):
+        """Queue names to be loaded a few at a time by step(), e.g. what the next state needs"""
+        self.pending.extend(name for name in names if name not in self.loaded and name not in self.pending)
+
+    def step(self, budget=PRELOAD_BUDGET):
+        """Load queued assets for about budget ms, returns True once the queue is empty"""
+        end = time.perf_counter() + budget / 1000
+        while self.pending:
+            self.load(self.pending.pop(0))
+            if time.perf_counter() >= end:
+                break
+        return not self.pending
+
+    def report(self):
+        """(key, ms) of everything loaded so far, slowest first"""
+        return sorted(self.load_times.items(), key=lambda item: -item[1])
+
+    def __getitem__(self, name):
+        if name in self.loaded:
+            return self.loaded[name]
+        if name not in self.sources:
+            raise KeyError(name)
+        return self.load(name)
+
+    def __setitem__(self, name, value):
+        self.loaded[name] = value
+
+    def __contains__(self, name):
+        # registered counts, whether or not it's been loaded yet
+        return name in self.loaded or name in self.sources
+
+    def get(self, name, default=None):
+        return self[name] if name in self else default
+
+    def keys(self):
+        return self.sources.keys() | self.loaded.keys()
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.keys())
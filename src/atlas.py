@@ -0,0 +1,90 @@
+import pygame, os, json, hashlib
+
+from .util import BASE_IMG_PATH, load_image
+
+# baked atlases & their frame manifests, safe to delete (they get rebuilt)
+ATLAS_CACHE = '.cache/'
+# bump when baking changes so old caches get rebuilt
+ATLAS_VERSION = 1
+# frames are packed into rows this wide (pixels)
+ATLAS_WIDTH = 256
+# transparent parts of a frame end up this colour & get keyed out, like the old sliced frames
+KEY_COLOR = (0, 0, 0)
+
+def sheet_rects(size, frame_size, frames=None):
+    """Source rects of a sheet's frames: frames=None takes every whole cell row by row,
+    an int takes that many frames along the top row and (columns, rows) takes a fixed grid"""
+    fw, fh = frame_size
+    if isinstance(frames, int):
+        return [(x * fw, 0, fw, fh) for x in range(frames)]
+    columns, rows = frames or (size[0] // fw, size[1] // fh)
+    return [(x * fw, y * fh, fw, fh) for y in range(rows) for x in range(columns)]
+
+def sheets_key(sheets):
+    """Hash of the sheet layout & every source file, a cached atlas is only used if it matches"""
+    digest = hashlib.sha1(json.dumps([ATLAS_VERSION, sorted((name, path, list(size), frames) for name, (path, size, frames) in sheets.items())]).encode())
+    for path in sorted({path for path, _, _ in sheets.values()}):
+        with open(BASE_IMG_PATH + path, 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+def bake(sheets):
+    """Pack every frame of sheets ({name: (path, frame size, frames)}) into one surface, returns it & {name: [rects]}"""
+    images = {path: load_image(path) for path in {path for path, _, _ in sheets.values()}}
+    cuts = {name: sheet_rects(images[path].get_size(), size, frames) for name, (path, size, frames) in sheets.items()}
+    sources = [(name, n, sheets[name][0], rect) for name, rects in cuts.items() for n, rect in enumerate(rects)]
+
+    # shelf packing, tallest frames first so rows waste little height
+    width = max([ATLAS_WIDTH] + [rect[2] for _, _, _, rect in sources])
+    placed = {name: [None] * len(rects) for name, rects in cuts.items()}
+    x = y = row_height = 0
+    for name, n, path, rect in sorted(sources, key=lambda source: -source[3][3]):
+        if x + rect[2] > width:
+            x = 0
+            y += row_height
+            row_height = 0
+        placed[name][n] = (x, y, rect[2], rect[3])
+        x += rect[2]
+        row_height = max(row_height, rect[3])
+
+    atlas = pygame.Surface((width, max(1, y + row_height)))
+    atlas.fill(KEY_COLOR)
+    for name, n, path, rect in sources:
+        # frames are blended onto the key colour, same as slicing onto a cleared scratch surface
+        atlas.blit(images[path], placed[name][n][:2], rect)
+    return atlas, placed
+
+def save_atlas(name, atlas, manifest):
+    os.makedirs(ATLAS_CACHE, exist_ok=True)
+    image_tmp = ATLAS_CACHE + name + '.tmp.png'
+    manifest_tmp = ATLAS_CACHE + name + '.tmp.json'
+    pygame.image.save(atlas, image_tmp)
+    os.replace(image_tmp, ATLAS_CACHE + name + '.png')
+    with open(manifest_tmp, 'w') as f:
+        json.dump(manifest, f)
+    os.replace(manifest_tmp, ATLAS_CACHE + name + '.json')
+
+def load_atlas(name, sheets):
+    """Frames for sheets ({name: (path, frame size, frames)}) as subsurfaces of one atlas,
+    read from the cache when the sources haven't changed and baked (& cached) when they have"""
+    key = sheets_key(sheets)
+    atlas = None
+    try:
+        with open(ATLAS_CACHE + name + '.json') as f:
+            manifest = json.load(f)
+        if manifest['key'] == key:
+            atlas = pygame.image.load(ATLAS_CACHE + name + '.png').convert()
+            rects = manifest['frames']
+    except (OSError, ValueError, KeyError, pygame.error):
+        atlas = None
+    if atlas is None:
+        atlas, rects = bake(sheets)
+        atlas = atlas.convert()
+        try:
+            save_atlas(name, atlas, {'key': key, 'size': atlas.get_size(), 'frames': rects})
+        except (OSError, pygame.error) as e:
+            # read-only installs (e.g. the web build) just bake every start
+            print(f"Couldn't cache atlas `{name}`: {e}")
+    atlas.set_colorkey(KEY_COLOR)
+    # subsurfaces share the atlas pixels & pick up its colorkey
+    return {sheet: [atlas.subsurface(rect) for rect in rects[sheet]] for sheet in sheets}
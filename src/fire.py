@@ -0,0 +1,47 @@
+from array import array
+
+# most flames alive at once, new ones are dropped when the pool is full
+FIRE_CAPACITY = 2048
+
+class Fire:
+    """Fixed size pool of flame particles, [pos, frame] each, drawn with one blits() call"""
+    def __init__(self, frames, capacity=FIRE_CAPACITY):
+        self.frames = frames
+        self.capacity = capacity
+        self.x = array('d', bytes(8 * capacity))
+        self.y = array('d', bytes(8 * capacity))
+        self.frame = array('d', bytes(8 * capacity))
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def add(self, pos, frame=0):
+        if self.count < self.capacity:
+            self.x[self.count] = pos[0]
+            self.y[self.count] = pos[1]
+            self.frame[self.count] = frame
+            self.count += 1
+
+    def clear(self):
+        self.count = 0
+
+    def update(self, dt):
+        x, y, frame = self.x, self.y, self.frame
+        length = len(self.frames)
+        i = 0
+        while i < self.count:
+            y[i] -= 2 * dt
+            frame[i] += 0.5 * dt
+            if frame[i] >= length:
+                # swap the last flame into this slot, order doesn't matter
+                self.count -= 1
+                x[i] = x[self.count]
+                y[i] = y[self.count]
+                frame[i] = frame[self.count]
+            else:
+                i += 1
+
+    def draw(self, surf, scroll=[0, 0]):
+        frames, x, y, frame = self.frames, self.x, self.y, self.frame
+        surf.blits([(frames[int(frame[i])], (x[i] - scroll[0] - 2.5, y[i] - scroll[1] - 2.5)) for i in range(self.count)], doreturn=False)
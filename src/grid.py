@@ -0,0 +1,231 @@
+import threading
+from array import array
+from itertools import compress
+
+from .util import finish
+
+# tile type names are stored as small integer ids, 0 means the cell is empty
+TILE_TYPES = ['']
+TILE_IDS = {'': 0}
+# levels are parsed on a worker thread too, new names are registered one at a time
+TYPES_LOCK = threading.Lock()
+
+# cells handled between the yields of TileGrid.from_planes_steps
+PLANE_SLICE = 1 << 13
+
+def type_id(name):
+    # unknown types (e.g. from new maps) get registered on first use
+    if name not in TILE_IDS:
+        with TYPES_LOCK:
+            if name not in TILE_IDS:
+                # the name goes in TILE_TYPES first, so its id always has a name once it's visible
+                TILE_TYPES.append(name)
+                TILE_IDS[name] = len(TILE_TYPES) - 1
+    return TILE_IDS[name]
+
+def type_name(tid):
+    return TILE_TYPES[tid]
+
+class TileGrid:
+    """Dense tile storage, one flat array per attribute indexed by (x, y)"""
+    def __init__(self, origin=(0, 0), size=(0, 0)):
+        self.origin = (int(origin[0]), int(origin[1]))
+        self.width = int(size[0])
+        self.height = int(size[1])
+        cells = self.width * self.height
+        self.types = array('B', bytes(cells))
+        self.variants = array('B', bytes(cells))
+        self.walked_on = array('B', bytes(cells))
+        # time on self.clock when a walked on tile gets destroyed
+        self.destruction_timer = array('d', bytes(8 * cells))
+        # seconds of tile updates so far
+        self.clock = 0.0
+        # flat indices of non-empty cells, so sparse maps don't walk every empty cell
+        self.cells = set()
+        # type id -> flat indices of the cells holding that type
+        self.by_type = {}
+
+    @classmethod
+    def from_tiles(cls, tiles):
+        """Build a grid sized to fit a list of json tiles ({'pos', 'type', 'variant'})"""
+        grid = cls.sized_for(tiles)
+        grid.add_tiles(tiles)
+        return grid
+
+    @classmethod
+    def sized_for(cls, tiles):
+        """Empty grid just big enough for a list of json tiles"""
+        if not tiles:
+            return cls()
+        xs = [tile['pos'][0] for tile in tiles]
+        ys = [tile['pos'][1] for tile in tiles]
+        return cls((min(xs), min(ys)), (max(xs) - min(xs) + 1, max(ys) - min(ys) + 1))
+
+    @classmethod
+    def from_planes(cls, origin, size, names, types, variants):
+        """Build a grid from dense byte planes whose type values index into names (a binary map's table)"""
+        return finish(cls.from_planes_steps(origin, size, names, types, variants))
+
+    @classmethod
+    def from_planes_steps(cls, origin, size, names, types, variants):
+        """from_planes() a slice of cells at a time, yields between slices & returns the grid"""
+        grid = cls(origin, size)
+        yield
+        # map the file's type indices onto our ids in one pass
+        table = bytes(type_id(names[i]) if 0 < i < len(names) else 0 for i in range(256))
+        types = bytes(types).translate(table)
+        grid.types = array('B', types)
+        grid.variants = array('B', bytes(variants))
+        tids = {tid for tid in set(table) - {0} if bytes([tid]) in types}
+        masks = {tid: bytes(i == tid for i in range(256)) for tid in tids}
+        grid.by_type = {tid: set() for tid in tids}
+        yield
+        for start in range(0, len(types), PLANE_SLICE):
+            plane = types[start:start + PLANE_SLICE]
+            cells = range(start, start + len(plane))
+            grid.cells.update(compress(cells, plane))
+            for tid, mask in masks.items():
+                grid.by_type[tid].update(compress(cells, plane.translate(mask)))
+            yield
+        return grid
+
+    def add_tiles(self, tiles):
+        for tile in tiles:
+            self.set(tile['pos'][0], tile['pos'][1], type_id(tile['type']), tile['variant'])
+
+    def index(self, x, y):
+        """Flat index of cell (x, y), or -1 if it lies outside the grid"""
+        x -= self.origin[0]
+        y -= self.origin[1]
+        if 0 <= x < self.width and 0 <= y < self.height:
+            return y * self.width + x
+        return -1
+
+    def pos(self, i):
+        return (i % self.width + self.origin[0], i // self.width + self.origin[1])
+
+    def get(self, x, y):
+        """Type id at (x, y), 0 if empty or out of bounds"""
+        i = self.index(x, y)
+        return self.types[i] if i >= 0 else 0
+
+    def set(self, x, y, tid, variant=0):
+        i = self.index(x, y)
+        if i < 0:
+            raise IndexError(f"Tile {x};{y} is outside the grid")
+        self.cells.add(i)
+        if self.types[i]:
+            self.by_type[self.types[i]].discard(i)
+        self.by_type.setdefault(tid, set()).add(i)
+        self.types[i] = tid
+        self.variants[i] = variant
+        self.walked_on[i] = 0
+        self.destruction_timer[i] = 0.0
+
+    def remove(self, x, y):
+        i = self.index(x, y)
+        if i >= 0 and self.types[i]:
+            self.by_type[self.types[i]].discard(i)
+            self.types[i] = 0
+            self.variants[i] = 0
+            self.walked_on[i] = 0
+            self.destruction_timer[i] = 0.0
+            self.cells.discard(i)
+
+    def of_type(self, tid):
+        """Flat indices of every cell holding type id tid"""
+        return self.by_type.get(tid, set())
+
+    def occupied(self):
+        """Flat indices of every non-empty cell, safe to modify the grid while iterating"""
+        return sorted(self.cells)
+
+class TileRef:
+    """Dict-like view of one grid cell, for code written against the old tile dicts"""
+    __slots__ = ('grid', 'i')
+
+    def __init__(self, grid, i):
+        self.grid = grid
+        self.i = i
+
+    def __getitem__(self, key):
+        grid = self.grid
+        if key == 'type':
+            return TILE_TYPES[grid.types[self.i]]
+        if key == 'variant':
+            return grid.variants[self.i]
+        if key == 'pos':
+            return list(grid.pos(self.i))
+        if key == 'walked_on':
+            return bool(grid.walked_on[self.i])
+        if key == 'destruction_timer':
+            # seconds left, like the old per-tile countdown
+            return grid.destruction_timer[self.i] - grid.clock if grid.walked_on[self.i] else 0.0
+        if key == 'timer':
+            return 0
+        raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        grid = self.grid
+        if key == 'type':
+            x, y = grid.pos(self.i)
+            grid.set(x, y, type_id(value), grid.variants[self.i])
+        elif key == 'variant':
+            grid.variants[self.i] = value
+        elif key == 'walked_on':
+            grid.walked_on[self.i] = int(value)
+        elif key == 'destruction_timer':
+            grid.destruction_timer[self.i] = grid.clock + value
+        else:
+            raise KeyError(key)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+class TileView:
+    """Read access to a TileGrid through the old "x;y" string keys"""
+    def __init__(self, grid):
+        self.grid = grid
+
+    def _index(self, loc):
+        try:
+            x, y = map(int, loc.split(';'))
+        except (AttributeError, ValueError):
+            return -1
+        i = self.grid.index(x, y)
+        return i if i >= 0 and self.grid.types[i] else -1
+
+    def __contains__(self, loc):
+        return self._index(loc) >= 0
+
+    def __getitem__(self, loc):
+        i = self._index(loc)
+        if i < 0:
+            raise KeyError(loc)
+        return TileRef(self.grid, i)
+
+    def get(self, loc, default=None):
+        i = self._index(loc)
+        return TileRef(self.grid, i) if i >= 0 else default
+
+    def __len__(self):
+        return len(self.grid.cells)
+
+    def keys(self):
+        for i in self.grid.occupied():
+            x, y = self.grid.pos(i)
+            yield f"{x};{y}"
+
+    __iter__ = keys
+
+    def values(self):
+        for i in self.grid.occupied():
+            yield TileRef(self.grid, i)
+
+    def items(self):
+        for i in self.grid.occupied():
+            x, y = self.grid.pos(i)
+            yield f"{x};{y}", TileRef(self.grid, i)
@@ -0,0 +1,153 @@
+from array import array
+from itertools import compress
+
+import pygame
+
+try:
+    import numpy as np
+except ImportError:
+    # optional (pygbag can ship it too), without it particles are stepped one at a time in python
+    np = None
+
+from .tiles import PHYSICS_IDS
+
+# most kickup particles alive at once at full quality, the python loop only keeps about this many within a few ms
+MAX_KICKUP = 20000 if np else 1200
+
+class Kickup:
+    """Kickup particles stored as parallel arrays instead of one [pos, vel, size, color] list each"""
+    def __init__(self):
+        self.x = array('d')
+        self.y = array('d')
+        self.vx = array('d')
+        self.vy = array('d')
+        self.size = array('d')
+        self.color = []
+
+    def __len__(self):
+        return len(self.size)
+
+    def add(self, pos, vel, size, color):
+        self.x.append(pos[0])
+        self.y.append(pos[1])
+        self.vx.append(vel[0])
+        self.vy.append(vel[1])
+        self.size.append(size)
+        self.color.append(color)
+
+    def clear(self):
+        del self.x[:], self.y[:], self.vx[:], self.vy[:], self.size[:], self.color[:]
+
+    def update(self, dt, tile_map):
+        if np:
+            self.update_arrays(dt, tile_map)
+        else:
+            self.update_loop(dt, tile_map)
+
+    def update_arrays(self, dt, tile_map):
+        """update() for every particle at once with numpy, same arithmetic in the same order as update_loop"""
+        if not len(self.size):
+            return
+        grid = tile_map.grid
+        width, height = grid.width, grid.height
+        ox, oy = grid.origin
+        tile_size = tile_map.tile_size
+        solid = np.zeros(256, dtype=bool)
+        solid[list(PHYSICS_IDS)] = True
+        types = np.frombuffer(grid.types, dtype=np.uint8) if len(grid.types) else np.zeros(1, dtype=np.uint8)
+
+        x = np.frombuffer(self.x, dtype=np.float64) + np.frombuffer(self.vx, dtype=np.float64) * dt
+        y = np.frombuffer(self.y, dtype=np.float64).copy()
+        vx = np.frombuffer(self.vx, dtype=np.float64).copy()
+        vy = np.frombuffer(self.vy, dtype=np.float64).copy()
+        # particles only move sideways before both checks, so they share a column
+        tx = (x // tile_size).astype(np.int64) - ox
+        in_column = (tx >= 0) & (tx < width)
+
+        def solid_at(y):
+            ty = (y // tile_size).astype(np.int64) - oy
+            inside = in_column & (ty >= 0) & (ty < height)
+            return inside & solid[types[np.where(inside, ty * width + tx, 0)]]
+
+        hit = solid_at(y)
+        vx[hit] *= -0.8
+        vy[hit] *= 0.999
+
+        vy += 0.1 * dt
+        y += vy * dt
+        hit = solid_at(y)
+        vy[hit] *= -0.8
+        vx[hit] *= 0.999
+
+        size = np.frombuffer(self.size, dtype=np.float64) - 0.1 * dt
+        alive = size > 0
+        if not alive.all():
+            self.color = list(compress(self.color, alive.tolist()))
+            x, y, vx, vy, size = (values[alive] for values in (x, y, vx, vy, size))
+        self.x, self.y, self.vx, self.vy, self.size = (array('d', values.tobytes()) for values in (x, y, vx, vy, size))
+
+    def update_loop(self, dt, tile_map):
+        # pull everything the loop needs into locals, bouncing checks the grid planes directly
+        x, y, vx, vy, size, color = self.x, self.y, self.vx, self.vy, self.size, self.color
+        grid = tile_map.grid
+        types, width, height = grid.types, grid.width, grid.height
+        ox, oy = grid.origin
+        tile_size = tile_map.tile_size
+
+        # live particles are compacted towards the front as we go, dead ones get cut off in one go at the end
+        alive = 0
+        for i in range(len(size)):
+            px = x[i] + vx[i] * dt
+            py = y[i]
+            pvx = vx[i]
+            pvy = vy[i]
+            tx = int(px // tile_size) - ox
+            ty = int(py // tile_size) - oy
+            if 0 <= tx < width and 0 <= ty < height and types[ty * width + tx] in PHYSICS_IDS:
+                pvx *= -0.8
+                pvy *= 0.999
+
+            pvy += 0.1 * dt
+            py += pvy * dt
+            ty = int(py // tile_size) - oy
+            if 0 <= tx < width and 0 <= ty < height and types[ty * width + tx] in PHYSICS_IDS:
+                pvy *= -0.8
+                pvx *= 0.999
+
+            s = size[i] - 0.1 * dt
+            if s > 0:
+                x[alive] = px
+                y[alive] = py
+                vx[alive] = pvx
+                vy[alive] = pvy
+                size[alive] = s
+                color[alive] = color[i]
+                alive += 1
+        del x[alive:], y[alive:], vx[alive:], vy[alive:], size[alive:], color[alive:]
+
+    def draw(self, surf, scroll=[0, 0]):
+        if np and len(self.size) and surf.get_bytesize() == 4:
+            self.draw_arrays(surf, scroll)
+        else:
+            self.draw_loop(surf, scroll)
+
+    def draw_arrays(self, surf, scroll):
+        """draw() as one write into the surface's pixels, later particles still end up on top"""
+        clip = surf.get_clip()
+        px = (np.frombuffer(self.x, dtype=np.float64) - scroll[0]).astype(np.int64)
+        py = (np.frombuffer(self.y, dtype=np.float64) - scroll[1]).astype(np.int64)
+        on = (px >= clip.left) & (px < clip.right) & (py >= clip.top) & (py < clip.bottom)
+        mapped = {color: surf.map_rgb(color) for color in set(self.color)}
+        colors = np.fromiter(map(mapped.__getitem__, self.color), dtype=np.uint32, count=len(self.color))
+        pixels = pygame.surfarray.pixels2d(surf)
+        pixels[px[on], py[on]] = colors[on]
+        # releases the surface lock
+        del pixels
+
+    def draw_loop(self, surf, scroll):
+        # lock once for the whole batch rather than once per pixel
+        surf.lock()
+        set_at = surf.set_at
+        for px, py, c in zip(self.x, self.y, self.color):
+            set_at((int(px - scroll[0]), int(py - scroll[1])), c)
+        surf.unlock()
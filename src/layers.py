@@ -0,0 +1,22 @@
+import pygame
+
+class Layers:
+    """Full-screen surfaces (scaled backdrop, solid overlays) kept for the current screen size"""
+    def __init__(self, backdrop, size):
+        self.backdrop_img = backdrop
+        self.resize(size)
+
+    def resize(self, size):
+        # only called when the window changes size, everything gets rebuilt for the new size
+        self.size = tuple(size)
+        self.backdrop = pygame.transform.scale(self.backdrop_img, self.size)
+        self.overlays = {}
+
+    def overlay(self, color, alpha):
+        """Solid screen-sized overlay, fades only change its alpha"""
+        if color not in self.overlays:
+            self.overlays[color] = pygame.Surface(self.size)
+            self.overlays[color].fill(color)
+        overlay = self.overlays[color]
+        overlay.set_alpha(alpha)
+        return overlay
@@ -0,0 +1,169 @@
+import sys, struct
+from array import array
+from itertools import compress
+
+try:
+    import mmap
+except ImportError:
+    # not every build has it (e.g. the web one), files are read into memory instead
+    mmap = None
+
+MAP_EXTENSION = '.map'
+MAP_MAGIC = b'DDMP'
+MAP_VERSION = 1
+# magic, version, flags, origin x, origin y, width, height, type names, tiles, off-grid records
+HEADER = struct.Struct('<4sHHiiIIHII')
+# type name index, variant, flags, x, y
+OFF_GRID = struct.Struct('<HHBdd')
+# header flag: the stored variants already follow the auto-tiling rules
+AUTO_TILED = 1
+# header flag: cells are stored as (index, type, variant) columns instead of full planes
+SPARSE = 2
+# sparse cells cost 6 bytes against 2 per cell for planes, only worth it when they're this much smaller
+SPARSE_GAIN = 4
+# off-grid record flag: pos was a pair of ints in the json
+INT_POS = 1
+
+def is_map_file(path):
+    return str(path).endswith(MAP_EXTENSION)
+
+def level_planes(level):
+    """Dense planes for a json level ({'tiles', 'off_grid'}): (origin, width, height, names, types, variants)"""
+    tiles = level['tiles']
+    # index 0 is the empty cell
+    names = ['']
+    ids = {'': 0}
+    for tile in tiles + level['off_grid']:
+        if tile['type'] not in ids:
+            ids[tile['type']] = len(names)
+            names.append(tile['type'])
+    if not tiles:
+        return (0, 0), 0, 0, names, bytearray(), bytearray()
+    xs = [tile['pos'][0] for tile in tiles]
+    ys = [tile['pos'][1] for tile in tiles]
+    origin = (min(xs), min(ys))
+    width = max(xs) - origin[0] + 1
+    height = max(ys) - origin[1] + 1
+    types = bytearray(width * height)
+    variants = bytearray(width * height)
+    for tile in tiles:
+        i = (tile['pos'][1] - origin[1]) * width + tile['pos'][0] - origin[0]
+        types[i] = ids[tile['type']]
+        variants[i] = tile['variant']
+    return origin, width, height, names, types, variants
+
+def write_map(path, origin, width, height, names, types, variants, off_grid, flags=0):
+    """Write dense planes (type ids index into names) & off-grid tiles as a binary map"""
+    if len(names) > 256:
+        raise ValueError("a binary map holds at most 256 tile types")
+    ids = {name: i for i, name in enumerate(names)}
+    count = len(types) - types.count(0)
+    flags &= ~SPARSE
+    if count * 6 * SPARSE_GAIN < len(types) * 2:
+        flags |= SPARSE
+    with open(path, 'wb') as f:
+        f.write(HEADER.pack(MAP_MAGIC, MAP_VERSION, flags, origin[0], origin[1], width, height, len(names), count, len(off_grid)))
+        for name in names:
+            encoded = name.encode('utf-8')
+            f.write(bytes([len(encoded)]) + encoded)
+        if flags & SPARSE:
+            indices = array('I', compress(range(len(types)), types))
+            if sys.byteorder == 'big':
+                indices.byteswap()
+            f.write(indices.tobytes())
+            f.write(bytes(types[i] for i in compress(range(len(types)), types)))
+            f.write(bytes(variants[i] for i in compress(range(len(types)), types)))
+        else:
+            f.write(types)
+            f.write(variants)
+        for tile in off_grid:
+            x, y = tile['pos']
+            f.write(OFF_GRID.pack(ids[tile['type']], tile['variant'], INT_POS if isinstance(x, int) and isinstance(y, int) else 0, x, y))
+
+def save_level(path, level, flags=0):
+    """Write a json level ({'tiles', 'off_grid'}) as a binary map"""
+    origin, width, height, names, types, variants = level_planes(level)
+    write_map(path, origin, width, height, names, types, variants, level['off_grid'], flags)
+
+class MapFile:
+    """An open binary map, dense types & variants are views straight into the (memory-mapped) file"""
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            try:
+                self.buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if mmap else f.read()
+            except ValueError:
+                # empty files can't be mapped
+                self.buffer = f.read()
+        view = memoryview(self.buffer)
+        if len(view) < HEADER.size:
+            raise ValueError(f"{path} is not a binary map")
+        magic, version, self.flags, ox, oy, self.width, self.height, name_count, self.count, off_grid_count = HEADER.unpack_from(view)
+        if magic != MAP_MAGIC or version != MAP_VERSION:
+            raise ValueError(f"{path} is not a version {MAP_VERSION} binary map")
+        self.origin = (ox, oy)
+
+        offset = HEADER.size
+        self.names = []
+        for _ in range(name_count):
+            length = view[offset]
+            self.names.append(bytes(view[offset + 1:offset + 1 + length]).decode('utf-8'))
+            offset += 1 + length
+
+        cells = self.width * self.height
+        if self.flags & SPARSE:
+            # scatter the stored cells into planes, few enough that a loop is fine
+            indices = array('I')
+            indices.frombytes(view[offset:offset + self.count * 4])
+            if sys.byteorder == 'big':
+                indices.byteswap()
+            offset += self.count * 4
+            self.types = bytearray(cells)
+            self.variants = bytearray(cells)
+            for i, tid, variant in zip(indices, view[offset:offset + self.count], view[offset + self.count:offset + self.count * 2]):
+                self.types[i] = tid
+                self.variants[i] = variant
+            offset += self.count * 2
+        else:
+            self.types = view[offset:offset + cells]
+            self.variants = view[offset + cells:offset + cells * 2]
+            offset += cells * 2
+
+        self.off_grid = []
+        for _ in range(off_grid_count):
+            tid, variant, flags, x, y = OFF_GRID.unpack_from(view, offset)
+            if flags & INT_POS:
+                x, y = int(x), int(y)
+            self.off_grid.append({'pos': [x, y], 'type': self.names[tid], 'variant': variant})
+            offset += OFF_GRID.size
+        self.view = view
+
+    def tiles(self):
+        """The on-grid tiles as json tiles, row by row"""
+        names, types, variants = self.names, self.types, self.variants
+        for i in range(self.width * self.height):
+            if types[i]:
+                yield {'pos': [i % self.width + self.origin[0], i // self.width + self.origin[1]], 'type': names[types[i]], 'variant': variants[i]}
+
+    def level(self):
+        """Everything as a json level ({'tiles', 'off_grid'})"""
+        return {'tiles': list(self.tiles()), 'off_grid': [dict(tile) for tile in self.off_grid]}
+
+    def close(self):
+        # views have to go before the map they point into
+        for plane in (self.types, self.variants):
+            if isinstance(plane, memoryview):
+                plane.release()
+        self.view.release()
+        if mmap and isinstance(self.buffer, mmap.mmap):
+            self.buffer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def load_level(path):
+    """Read a binary map back into a json level ({'tiles', 'off_grid'})"""
+    with MapFile(path) as level:
+        return level.level()
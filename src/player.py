@@ -183,17 +183,19 @@ class Player:
 
         self.update_anim(dt)
 
-    def draw(self, surf, scroll):
+    def draw(self, surf, scroll, pos=None):
+        # pos can be passed in to draw somewhere other than self.pos (e.g. interpolated between ticks)
+        pos = self.pos if pos is None else pos
         if self.falling > 3:
             self.jump.flip = self.flip
-            self.jump.render(surf, scroll, self.pos)
+            self.jump.render(surf, scroll, pos)
         elif self.grounded < 30:
             self.jump.flip = self.flip
-            self.jump.render(surf, scroll, self.pos)
+            self.jump.render(surf, scroll, pos)
         elif abs(self.movement.x) > 0.1:
             self.jump.flip = self.flip
-            self.jump.render(surf, scroll, self.pos)
+            self.jump.render(surf, scroll, pos)
         else:
             self.jump.flip = self.flip
-            self.jump.render(surf, scroll, self.pos)
+            self.jump.render(surf, scroll, pos)
         # pygame.draw.rect(surf, (255, 0, 0), (self.pos.x - scroll[0], self.pos.y - scroll[1], self.dimensions.x, self.dimensions.y))
\ No newline at end of file
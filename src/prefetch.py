@@ -0,0 +1,72 @@
+import sys, time, threading
+
+from .tiles import TileMap, parse_level_steps
+from .util import finish
+
+# ms per frame spent building the next level on the game loop, small enough not to cost a frame
+PREFETCH_BUDGET = 2
+# the map file is read on a worker thread, except on the web build (pygbag has no threads),
+# where it's read a few steps per frame like the rest
+THREADED = sys.platform != 'emscripten'
+
+class LevelPrefetch:
+    """Builds the TileMap for an upcoming level: the file is parsed on a worker thread, the rest
+    (which needs the app's surfaces) a few load steps per frame from the game loop"""
+    def __init__(self, app, level, path, threaded=THREADED):
+        self.level = level
+        self.path = path
+        self.tile_map = TileMap(app)
+        # (grid, off-grid tiles) once the worker has parsed the file
+        self.parsed = None
+        self.steps = None
+        self.done = False
+        self.error = None
+        self.thread = None
+        if threaded:
+            self.thread = threading.Thread(target=self.parse, daemon=True)
+            try:
+                self.thread.start()
+            except RuntimeError:
+                self.thread = None
+        if not self.thread:
+            self.steps = self.tile_map.load_steps(path)
+
+    def parse(self):
+        try:
+            self.parsed = finish(parse_level_steps(self.path))
+        except Exception as e:
+            # anything wrong with the map, the game loop finds it in error
+            self.error = e
+
+    def step(self, budget=PREFETCH_BUDGET):
+        """Work on the level for up to budget ms, returns True once it's built (or failed)"""
+        end = time.perf_counter() + budget / 1000
+        if self.steps is None:
+            if self.thread.is_alive():
+                return False
+            if self.error:
+                self.done = True
+                return True
+            self.steps = self.tile_map.load_steps(self.path, self.parsed)
+        while not self.done:
+            try:
+                next(self.steps)
+            except StopIteration:
+                self.done = True
+            except Exception as e:
+                # a bad map mustn't take the game loop down, it's kept until result()
+                self.error = e
+                self.done = True
+            if time.perf_counter() >= end:
+                break
+        return self.done
+
+    def result(self):
+        """The built TileMap, blocking to finish it if it isn't ready yet, raises whatever building it raised"""
+        if self.thread:
+            self.thread.join()
+        while not self.done:
+            self.step(float('inf'))
+        if self.error:
+            raise self.error
+        return self.tile_map
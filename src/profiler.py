@@ -0,0 +1,124 @@
+import pygame, time, csv
+from array import array
+
+# frames of timings kept, older ones get overwritten
+PROFILE_FRAMES = 240
+# parts of a frame that get timed, in the order they're stacked in the graph
+PHASES = ['tiles.update', 'player', 'portal', 'tiles.draw', 'kickup', 'sparks', 'smoke', 'fire', 'hud', 'present']
+PHASE_COLORS = {
+    'tiles.update': (86, 180, 233),
+    'player': (0, 158, 115),
+    'portal': (240, 228, 66),
+    'tiles.draw': (80, 140, 255),
+    'kickup': (230, 159, 0),
+    'sparks': (255, 255, 255),
+    'smoke': (150, 150, 150),
+    'fire': (213, 94, 0),
+    'hud': (204, 121, 167),
+    'present': (120, 80, 200),
+}
+# live counts shown under the graph & written with the timings
+COUNTERS = ['particles', 'smoke', 'visible tiles']
+# graph size in pixels, the graph is GRAPH_MS tall with a line at 60 fps
+GRAPH_WIDTH = 120
+GRAPH_HEIGHT = 50
+GRAPH_MS = 1000 / 30
+TARGET_MS = 1000 / 60
+# frames averaged for the numbers in the legend
+LEGEND_FRAMES = 30
+LINE_HEIGHT = 8
+
+class Profiler:
+    """Per-phase frame timings in a ring buffer, drawn as a stacked graph when shown"""
+    def __init__(self, phases=PHASES, counters=COUNTERS, frames=PROFILE_FRAMES):
+        self.phases = list(phases)
+        self.counters = list(counters)
+        self.frames = frames
+        # phase -> ms spent per frame, counter -> value at the end of each frame
+        self.times = {phase: array('d', bytes(8 * frames)) for phase in self.phases}
+        self.counts = {name: array('q', bytes(8 * frames)) for name in self.counters}
+        # what the frame in progress has used so far
+        self.current = dict.fromkeys(self.phases, 0.0)
+        self.live = dict.fromkeys(self.counters, 0)
+        # frames recorded so far
+        self.frame = 0
+        self.visible = False
+        self.panel = None
+
+    def add(self, phase, start):
+        """Count the time since start (a time.perf_counter() value) towards phase for this frame"""
+        self.current[phase] += time.perf_counter() - start
+
+    def count(self, name, value):
+        self.live[name] = value
+
+    def end_frame(self):
+        slot = self.frame % self.frames
+        for phase, seconds in self.current.items():
+            self.times[phase][slot] = seconds * 1000
+            self.current[phase] = 0.0
+        for name, value in self.live.items():
+            self.counts[name][slot] = value
+        self.frame += 1
+
+    def slots(self, last=None):
+        """Ring buffer slots of the recorded frames, oldest first"""
+        recorded = min(self.frame, self.frames)
+        if last is not None:
+            recorded = min(recorded, last)
+        return [i % self.frames for i in range(self.frame - recorded, self.frame)]
+
+    def average(self, phase, last=LEGEND_FRAMES):
+        slots = self.slots(last)
+        return sum(self.times[phase][i] for i in slots) / len(slots) if slots else 0.0
+
+    def dump_csv(self, path):
+        """Write every recorded frame (ms per phase, counts) oldest first"""
+        with open(path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['frame'] + [f"{phase} ms" for phase in self.phases] + ['total ms'] + self.counters)
+            first = self.frame - min(self.frame, self.frames)
+            for n, i in enumerate(self.slots()):
+                times = [self.times[phase][i] for phase in self.phases]
+                writer.writerow([first + n] + [f"{t:.4f}" for t in times] + [f"{sum(times):.4f}"] + [self.counts[name][i] for name in self.counters])
+
+    def draw(self, surf, font, text):
+        """Draw the graph, legend & counts in the bottom left of surf, text is the app's TextCache"""
+        legend_width = 90
+        width = GRAPH_WIDTH + legend_width + 12
+        height = max(GRAPH_HEIGHT, LINE_HEIGHT * len(self.phases)) + LINE_HEIGHT * len(self.counters) + 12
+        if not self.panel or self.panel.get_size() != (width, height):
+            self.panel = pygame.Surface((width, height))
+            self.panel.set_alpha(170)
+        left = 4
+        top = surf.get_height() - height - 4
+        surf.blit(self.panel, (left, top))
+
+        # one column per frame, phases stacked bottom up
+        scale = GRAPH_HEIGHT / GRAPH_MS
+        bottom = top + 4 + GRAPH_HEIGHT
+        for column, i in enumerate(self.slots(GRAPH_WIDTH)):
+            x = left + 4 + column
+            # stack in floats so phases under a pixel still add up
+            y = float(bottom)
+            for phase in self.phases:
+                next_y = max(top + 4, y - self.times[phase][i] * scale)
+                if int(y) > int(next_y):
+                    surf.fill(PHASE_COLORS.get(phase, (255, 255, 255)), (x, int(next_y), 1, int(y) - int(next_y)))
+                y = next_y
+        target = bottom - int(TARGET_MS * scale)
+        pygame.draw.line(surf, (255, 60, 60), (left + 4, target), (left + 4 + GRAPH_WIDTH, target))
+
+        # legend with the recent average of each phase
+        x = left + GRAPH_WIDTH + 8
+        y = top + 4
+        for phase in self.phases:
+            color = PHASE_COLORS.get(phase, (255, 255, 255))
+            surf.fill(color, (x, y + 1, 4, 4))
+            surf.blit(text.render(font, f"{phase} {self.average(phase):.1f}", color), (x + 6, y))
+            y += LINE_HEIGHT
+
+        y = top + 8 + max(GRAPH_HEIGHT, LINE_HEIGHT * len(self.phases))
+        for name in self.counters:
+            surf.blit(text.render(font, f"{name}: {self.live[name]}", (255, 255, 255)), (left + 4, y))
+            y += LINE_HEIGHT
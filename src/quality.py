@@ -0,0 +1,52 @@
+from collections import deque
+
+from .kickup import MAX_KICKUP
+from .sparks import MAX_SPARKS
+
+# frame time (ms) we want to stay under, 60 fps
+TARGET_FRAME_TIME = 1000 / 60
+# number of frames averaged before quality gets adjusted
+QUALITY_WINDOW = 30
+
+# setting: (lowest quality, highest quality)
+QUALITY_LIMITS = {
+    # particles spawned per destroyed tile
+    'kickup': (4, 20),
+    'sparks': (4, 20),
+    'smoke': (0, 10),
+    'fire': (2, 10),
+    # most particles alive at once
+    'max_kickup': (400, MAX_KICKUP),
+    'max_sparks': (200, MAX_SPARKS),
+    'max_smoke': (0, 400),
+    'max_fire': (100, 2048),
+    # floating clouds in the sky
+    'clouds': (1, 4),
+    # screen shake on/off
+    'screen_shake': (0, 1),
+}
+
+class Quality:
+    """Scales effect settings between their limits based on how long recent frames took"""
+    def __init__(self, limits=QUALITY_LIMITS, target=TARGET_FRAME_TIME, window=QUALITY_WINDOW):
+        self.limits = dict(limits)
+        self.target = target
+        self.frame_times = deque(maxlen=window)
+        # 0.0 = every setting at its lowest, 1.0 = every setting at its highest
+        self.level = 1.0
+
+    def update(self, frame_time):
+        """Feed in the time (ms) the last frame took to process"""
+        self.frame_times.append(frame_time)
+        if len(self.frame_times) == self.frame_times.maxlen:
+            average = sum(self.frame_times) / len(self.frame_times)
+            # drop quickly when we're too slow, creep back up when there's plenty of headroom
+            if average > self.target:
+                self.level = max(0.0, self.level - 0.1)
+            elif average < self.target * 0.6:
+                self.level = min(1.0, self.level + 0.05)
+            self.frame_times.clear()
+
+    def get(self, setting):
+        lowest, highest = self.limits[setting]
+        return round(lowest + (highest - lowest) * self.level)
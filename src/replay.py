@@ -0,0 +1,71 @@
+import struct, zlib
+from array import array
+
+REPLAY_MAGIC = b'DDRP'
+REPLAY_VERSION = 2
+# magic, version, rng seed, tick rate, starting level, number of ticks
+HEADER = struct.Struct('<4sHQHHI')
+# per tick: held controls (bits), dt, quality level, number of actions fired,
+# followed by that many action ids in the order they were fired
+TICK = struct.Struct('<BddB')
+
+# bit order of Player.controls in a recorded tick
+CONTROLS = ('up', 'down', 'left', 'right')
+# one-off inputs App.tick applies before simulating, by id
+ACTIONS = ('start', 'restart', 'pause', 'reset')
+
+class Recorder:
+    """Collects the input the simulation sees every tick, saved as a header + zlib packed ticks"""
+    def __init__(self, seed, tick_rate, level=0):
+        self.seed = seed
+        self.tick_rate = tick_rate
+        self.level = level
+        self.ticks = bytearray()
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def record(self, controls, actions, dt, quality):
+        held = sum(1 << i for i, name in enumerate(CONTROLS) if controls[name])
+        self.ticks += TICK.pack(held, dt, quality, len(actions))
+        self.ticks += bytes(ACTIONS.index(name) for name in actions)
+        self.count += 1
+
+    def save(self, path):
+        with open(path, 'wb') as f:
+            f.write(HEADER.pack(REPLAY_MAGIC, REPLAY_VERSION, self.seed, self.tick_rate, self.level, self.count))
+            f.write(zlib.compress(bytes(self.ticks)))
+
+class Replay:
+    """A recording loaded back, index it to get (controls, actions, dt, quality) for a tick"""
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            data = f.read()
+        magic, version, self.seed, self.tick_rate, self.level, self.count = HEADER.unpack_from(data)
+        if magic != REPLAY_MAGIC or version != REPLAY_VERSION:
+            raise ValueError(f"{path} is not a version {REPLAY_VERSION} replay")
+        self.ticks = zlib.decompress(data[HEADER.size:])
+        # ticks vary in length with their actions, so find where each one starts
+        self.offsets = array('I')
+        offset = 0
+        for _ in range(self.count):
+            if offset + TICK.size > len(self.ticks):
+                break
+            self.offsets.append(offset)
+            offset += TICK.size + self.ticks[offset + TICK.size - 1]
+        if len(self.offsets) != self.count or offset != len(self.ticks):
+            raise ValueError(f"{path} is truncated")
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, i):
+        if not 0 <= i < self.count:
+            raise IndexError(i)
+        offset = self.offsets[i]
+        held, dt, quality, fired = TICK.unpack_from(self.ticks, offset)
+        controls = {name: bool(held & 1 << bit) for bit, name in enumerate(CONTROLS)}
+        start = offset + TICK.size
+        actions = [ACTIONS[action] for action in self.ticks[start:start + fired]]
+        return controls, actions, dt, quality
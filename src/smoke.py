@@ -1,7 +1,33 @@
-import pygame, random
+import pygame
+
+from .util import rng
 
 SMOKE_DELAY = 100
 FADE = 4
+# smoke frames are pre-rendered with the angle rounded to this many degrees
+SMOKE_ANGLE_STEP = 5
+
+# color -> unrotated 100x100 smoke square
+SMOKE_BASES = {}
+# (color, angle bucket, timer bucket) -> rotated, scaled & faded frame
+SMOKE_ATLAS = {}
+
+def smoke_frame(color, size, angle, timer):
+    # a square looks the same every 90 degrees, so only a quarter turn needs frames
+    angle_step = round(angle / SMOKE_ANGLE_STEP) % (90 // SMOKE_ANGLE_STEP)
+    timer_step = int(timer)
+    key = (color, angle_step, timer_step)
+    if key not in SMOKE_ATLAS:
+        if color not in SMOKE_BASES:
+            img = pygame.Surface((size, size))
+            pygame.draw.rect(img, color, (1, 1, size - 2, size - 2))
+            img.set_colorkey((0, 0, 0))
+            SMOKE_BASES[color] = img
+        img = SMOKE_BASES[color]
+        img.set_alpha(int(255 - 255 * timer_step / SMOKE_DELAY * FADE))
+        SMOKE_ATLAS[key] = pygame.transform.scale(pygame.transform.rotate(img, angle_step * SMOKE_ANGLE_STEP),
+                                                  (1 + size * timer_step / SMOKE_DELAY, 1 + size * timer_step / SMOKE_DELAY)).convert_alpha()
+    return SMOKE_ATLAS[key]
 
 class Smoke:
     def __init__(self, x, y, dx, dy, color):
@@ -11,18 +37,14 @@ class Smoke:
         self.dy = dy
         self.size = 100
         self.timer = 0
-        self.img = pygame.Surface((self.size, self.size))
-        pygame.draw.rect(self.img, color, (1, 1, self.size - 2, self.size - 2))
-        self.img.set_colorkey((0, 0, 0))
-        self.img.convert_alpha()
-        self.target_angle = random.random() * 360 + 720
+        self.color = tuple(color)
+        self.target_angle = rng.random() * 360 + 720
         self.angle = 0
-        self.smoke = []
-    
+
     @property
     def pos(self):
         return self.x, self.y
-    
+
     def update(self, dt):
         self.x += self.dx * dt
         self.y += self.dy * dt
@@ -30,9 +52,6 @@ class Smoke:
         self.dy += (self.dy * 0.989 - self.dy) * dt
         self.timer += 1 * dt
         self.angle += (self.target_angle - self.angle) / 15 * dt
-    
+
     def draw(self, surf, scroll=[0, 0]):
-        self.img.set_alpha(int(255 - 255 * self.timer / SMOKE_DELAY * FADE))
-        img_copy = pygame.transform.scale(pygame.transform.rotate(self.img, (self.angle)),
-                                          (1 + self.size * self.timer / SMOKE_DELAY, 1 + self.size * self.timer / SMOKE_DELAY)).convert_alpha()
-        surf.blit(img_copy, (self.x - scroll[0], self.y - scroll[1]))
+        surf.blit(smoke_frame(self.color, self.size, self.angle, self.timer), (self.x - scroll[0], self.y - scroll[1]))
@@ -1,4 +1,21 @@
 import pygame, math
+from array import array
+from itertools import compress
+
+try:
+    import numpy as np
+except ImportError:
+    # optional, without it sparks are stepped one at a time in python
+    np = None
+
+# sparks are drawn from pre-rasterized sprites, bucketed by angle & speed
+ANGLE_STEPS = 64
+SPEED_STEP = 0.05
+# most sparks alive at once at full quality, the python loop only keeps about this many within a couple of ms
+MAX_SPARKS = 4000 if np else 1000
+
+# (color, scale, spinny, angle bucket, speed bucket) -> (sprite, offset)
+SPARK_SPRITES = {}
 
 class Spark:
     def __init__(self, loc, angle, speed, color, scale=1, spinny=False):
@@ -46,7 +63,7 @@ class Spark:
 
         return self.speed <= 0
 
-    def draw(self, surf, scroll=[0, 0]):
+    def points(self, scroll=[0, 0]):
         if not self.spinny:
             points = [
                 [self.loc[0] - scroll[0] + math.cos(self.angle) * self.speed * self.scale, self.loc[1] - scroll[1] + math.sin(self.angle) * self.speed * self.scale],
@@ -63,5 +80,130 @@ class Spark:
                 (self.loc[0] + math.cos(self.angle - math.pi * 0.5) * self.speed * 0.5 - scroll[0], self.loc[1] + math.sin(self.angle - math.pi * 0.5) * self.speed * 0.5 - scroll[1]),
                 (self.loc[0] + math.cos(self.angle - math.pi * 0.125) * self.speed * 2 - scroll[0], self.loc[1] + math.sin(self.angle - math.pi * 0.125) * self.speed * 2 - scroll[1])
             ]
-        pygame.draw.polygon(surf, self.color, points)
+        return points
+
+    def draw(self, surf, scroll=[0, 0]):
+        pygame.draw.polygon(surf, self.color, self.points(scroll))
+
+def spark_sprite(color, scale, spinny, angle_step, speed_step):
+    key = (color, scale, spinny, angle_step, speed_step)
+    if key not in SPARK_SPRITES:
+        # let a Spark at the origin work out the polygon, then rasterize it once
+        spark = Spark([0, 0], angle_step / ANGLE_STEPS * math.pi * 2, speed_step * SPEED_STEP, color, scale, spinny)
+        points = spark.points()
+        left = math.floor(min(p[0] for p in points))
+        top = math.floor(min(p[1] for p in points))
+        size = (math.ceil(max(p[0] for p in points)) - left + 1, math.ceil(max(p[1] for p in points)) - top + 1)
+        sprite = pygame.Surface(size, pygame.SRCALPHA)
+        pygame.draw.polygon(sprite, color, [(p[0] - left, p[1] - top) for p in points])
+        SPARK_SPRITES[key] = (sprite, (left, top))
+    return SPARK_SPRITES[key]
+
+class SparkSystem:
+    """All live sparks in parallel arrays, updated & drawn in one batch"""
+    def __init__(self):
+        self.x = array('d')
+        self.y = array('d')
+        self.angle = array('d')
+        self.speed = array('d')
+        self.scale = array('d')
+        self.spinny = array('B')
+        self.color = []
+
+    def __len__(self):
+        return len(self.speed)
+
+    def add(self, loc, angle, speed, color, scale=1, spinny=False):
+        self.x.append(loc[0])
+        self.y.append(loc[1])
+        self.angle.append(angle)
+        self.speed.append(speed)
+        self.scale.append(scale)
+        self.spinny.append(int(spinny))
+        self.color.append(tuple(color))
+
+    def append(self, spark):
+        self.add(spark.loc, spark.angle, spark.speed, spark.color, spark.scale, spark.spinny)
+
+    def clear(self):
+        del self.x[:], self.y[:], self.angle[:], self.speed[:], self.scale[:], self.spinny[:], self.color[:]
 
+    def update(self, dt):
+        if np:
+            self.update_arrays(dt)
+        else:
+            self.update_loop(dt)
+
+    def update_arrays(self, dt):
+        """update() for every spark at once with numpy, the same steps as update_loop"""
+        if not len(self.speed):
+            return
+        pi = math.pi
+        a = np.frombuffer(self.angle, dtype=np.float64)
+        s = np.frombuffer(self.speed, dtype=np.float64)
+        x = np.frombuffer(self.x, dtype=np.float64) + np.cos(a) * s * dt
+        y = np.frombuffer(self.y, dtype=np.float64) + np.sin(a) * s * dt
+
+        # point_towards(pi / 2, 0.02, dt)
+        rotate_direction = ((pi / 2 - a + pi * 3) % (pi * 2)) - pi
+        a = np.where(np.abs(rotate_direction) < 0.02, pi / 2, a + 0.02 * np.where(rotate_direction < 0, -1.0, 1.0) * dt)
+
+        # velocity_adjust(0.975, 0, 1, dt)
+        mx = np.cos(a) * s
+        my = np.minimum(1, np.sin(a) * s)
+        mx += (mx * 0.975 - mx) * dt
+        a = np.arctan2(my, mx)
+
+        s = s - 0.1 * dt
+        scale = np.frombuffer(self.scale, dtype=np.float64)
+        spinny = np.frombuffer(self.spinny, dtype=np.uint8)
+        # sparks stick around until their speed goes negative
+        alive = s >= 0
+        if not alive.all():
+            self.color = list(compress(self.color, alive.tolist()))
+            x, y, a, s, scale, spinny = (values[alive] for values in (x, y, a, s, scale, spinny))
+        self.x, self.y, self.angle, self.speed, self.scale = (array('d', values.tobytes()) for values in (x, y, a, s, scale))
+        self.spinny = array('B', spinny.tobytes())
+
+    def update_loop(self, dt):
+        # same steps as Spark.update, inlined over every spark
+        x, y, angle, speed, scale, spinny, color = self.x, self.y, self.angle, self.speed, self.scale, self.spinny, self.color
+        cos, sin, atan2, pi = math.cos, math.sin, math.atan2, math.pi
+        alive = 0
+        for i in range(len(speed)):
+            a = angle[i]
+            s = speed[i]
+            x[alive] = x[i] + cos(a) * s * dt
+            y[alive] = y[i] + sin(a) * s * dt
+
+            # point_towards(pi / 2, 0.02, dt)
+            rotate_direction = ((pi / 2 - a + pi * 3) % (pi * 2)) - pi
+            if abs(rotate_direction) < 0.02:
+                a = pi / 2
+            else:
+                a += 0.02 * (-1 if rotate_direction < 0 else 1) * dt
+
+            # velocity_adjust(0.975, 0, 1, dt)
+            mx = cos(a) * s
+            my = min(1, sin(a) * s)
+            mx += (mx * 0.975 - mx) * dt
+            a = atan2(my, mx)
+
+            s -= 0.1 * dt
+            # sparks stick around until their speed goes negative
+            if s >= 0:
+                angle[alive] = a
+                speed[alive] = s
+                scale[alive] = scale[i]
+                spinny[alive] = spinny[i]
+                color[alive] = color[i]
+                alive += 1
+        del x[alive:], y[alive:], angle[alive:], speed[alive:], scale[alive:], spinny[alive:], color[alive:]
+
+    def draw(self, surf, scroll=[0, 0]):
+        blits = []
+        tau = math.pi * 2
+        for i in range(len(self.speed)):
+            sprite, offset = spark_sprite(self.color[i], self.scale[i], self.spinny[i], round(self.angle[i] % tau / tau * ANGLE_STEPS) % ANGLE_STEPS, round(self.speed[i] / SPEED_STEP))
+            blits.append((sprite, (self.x[i] - scroll[0] + offset[0], self.y[i] - scroll[1] + offset[1])))
+        surf.blits(blits, doreturn=False)
@@ -0,0 +1,28 @@
+import time
+
+# parts of a start, in the order they happen
+STARTUP_PHASES = ['import', 'pygame init', 'display', 'assets', 'setup', 'first frame']
+# ms from importing main.py to the first frame on screen, the startup check fails past this
+FIRST_FRAME_BUDGET = 1000
+
+class StartupTrace:
+    """Time spent in each part of starting up, every mark() ends the phase that began at the one before"""
+    def __init__(self, start=None):
+        # a time.perf_counter() value, e.g. taken at the top of main.py so imports count
+        self.start = time.perf_counter() if start is None else start
+        self.last = self.start
+        # phase -> ms
+        self.phases = {}
+
+    def mark(self, phase):
+        now = time.perf_counter()
+        self.phases[phase] = self.phases.get(phase, 0.0) + (now - self.last) * 1000
+        self.last = now
+
+    def total(self):
+        """ms from the start to the last mark"""
+        return (self.last - self.start) * 1000
+
+    def lines(self):
+        phases = [phase for phase in STARTUP_PHASES if phase in self.phases] + [phase for phase in self.phases if phase not in STARTUP_PHASES]
+        return [f"{phase:<12} {self.phases[phase]:>8.1f} ms" for phase in phases] + [f"{'total':<12} {self.total():>8.1f} ms"]
@@ -0,0 +1,26 @@
+from collections import OrderedDict
+
+# most rendered strings kept around
+TEXT_CACHE_SIZE = 256
+
+class TextCache:
+    """Rendered text surfaces keyed by (font, string, colour), least recently used ones get dropped"""
+    def __init__(self, size=TEXT_CACHE_SIZE):
+        self.size = size
+        self.surfs = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def render(self, font, text, color, antialias=True):
+        # surfaces are shared, so anything that changes one (e.g. set_alpha) should set it before every blit
+        key = (font, text, tuple(color), antialias)
+        if key in self.surfs:
+            self.hits += 1
+            self.surfs.move_to_end(key)
+            return self.surfs[key]
+        self.misses += 1
+        surf = font.render(text, antialias, color)
+        self.surfs[key] = surf
+        if len(self.surfs) > self.size:
+            self.surfs.popitem(last=False)
+        return surf
@@ -1,10 +1,16 @@
-import pygame, math, random
+import pygame, math, heapq
+from itertools import islice
 
-from .util import read_json
-from .sparks import Spark
+from .util import read_json_steps, rng
+from .mapfile import MapFile, is_map_file, AUTO_TILED
 from .smoke import Smoke
+from .grid import TileGrid, TileRef, TileView, type_id, type_name
 
 TILE_SIZE = 8
+# static tiles are pre-rendered in chunks of CHUNK_SIZE x CHUNK_SIZE tiles (same grid as the level editor)
+CHUNK_SIZE = 9
+# baked chunks kept around at most (about 20 KB each), the ones drawn longest ago are dropped first
+CHUNK_CACHE = 256
 # offsets set
 OFFSETS = {(-1, 0), (-1, -1), (0, -1), (1, -1), (1, 0), (1, 1), (0, 1), (-1, 1), (0, 0)}
 PHYSICS_TILES = {'rock', 'cloud', 'grass', 'moss'}
@@ -13,205 +19,306 @@ HOLLOW_TILES = {'portal'}
 DESTRUCTIBLE_TILES = {'cloud'}
 # time in seconds before tile destroys after being walked on
 DESTRUCTION_TIME = 0.4
+# number of pre-rendered frames for the fade out of a tile being destroyed
+FADE_STEPS = 32
+# tiles handled between the yields of parse_level_steps
+LOAD_BATCH = 500
 
 AUTO_TILE_TYPES = {'grass', 'cloud', 'rock', 'moss'}
 AUTO_TILE_MAP = {'0011': 1, '1011': 2, '1001': 3, '0001': 4, '0111': 5, '1111': 6, '1101': 7, '0101': 8,
                 '0110': 9, '1110': 10, '1100': 11, '0100': 12, '0010': 13, '1010': 14, '1000': 15, '0000': 16}
+# AUTO_TILE_MAP as a lookup by neighbour bitmask (left << 3 | up << 2 | right << 1 | down), giving the variant
+AUTO_TILE_BITS = [AUTO_TILE_MAP[f"{mask:04b}"] - 1 for mask in range(16)]
+
+# the same sets as type ids, to check against the grid planes directly
+PHYSICS_IDS = {type_id(t) for t in PHYSICS_TILES}
+PORTAL_ID = type_id('portal')
+DESTRUCTIBLE_IDS = {type_id(t) for t in DESTRUCTIBLE_TILES}
+AUTO_TILE_IDS = {type_id(t) for t in AUTO_TILE_TYPES}
+
+# tile surface -> its fade frames, shared between levels
+FADE_FRAMES = {}
+
+def fade_frames(tile_surf):
+    """Flash & fade frames for a destructible tile, from gone (0) to untouched (FADE_STEPS)"""
+    if tile_surf not in FADE_FRAMES:
+        frames = []
+        red_overlay = pygame.Surface(tile_surf.get_size())
+        red_overlay.fill((255, 100, 100))
+        for step in range(FADE_STEPS + 1):
+            # how much time is left (0.0 to 1.0)
+            time_left = step / FADE_STEPS
+            frame = tile_surf.copy()
+            # Start flashing red when less than half time left
+            if time_left < 0.5:
+                red_overlay.set_alpha(int((1 - time_left * 2) * 100))  # 0 to 100
+                frame.blit(red_overlay, (0, 0))
+            # Make tile more transparent as it approaches destruction
+            frame.set_alpha(int(time_left * 255))
+            frames.append(frame)
+        FADE_FRAMES[tile_surf] = frames
+    return FADE_FRAMES[tile_surf]
+
+def pack_tile(tile):
+    # json tiles as tuples of plain values while a level is read, the garbage collector doesn't track those
+    return (tile['pos'][0], tile['pos'][1], tile['type'], tile['variant'])
+
+def parse_level_steps(path):
+    """Read a level file into an auto-tiled grid & its off-grid tiles, yielding between small pieces of work.
+    Doesn't touch pygame, so it can run on a worker thread"""
+    if is_map_file(path):
+        # binary maps hand their planes straight to the grid
+        with MapFile(path) as level:
+            origin, size, names = level.origin, (level.width, level.height), level.names
+            types, variants = bytes(level.types), bytes(level.variants)
+            off_grid = level.off_grid
+            tiled = level.flags & AUTO_TILED
+        yield
+        grid = yield from TileGrid.from_planes_steps(origin, size, names, types, variants)
+        # tile once up front, so later removals only need to re-tile their neighbours
+        if not tiled:
+            yield from auto_tile_steps(grid)
+        return grid, off_grid
+
+    data = yield from read_json_steps(path, pack=pack_tile)
+    tiles = data['level']['tiles']
+    off_grid = [{'pos': [x, y], 'type': name, 'variant': variant} for x, y, name, variant in data['level']['off_grid']]
+    if not tiles:
+        return TileGrid(), off_grid
+    left = top = math.inf
+    right = bottom = -math.inf
+    for start in range(0, len(tiles), LOAD_BATCH):
+        batch = tiles[start:start + LOAD_BATCH]
+        left = min(left, min(tile[0] for tile in batch))
+        right = max(right, max(tile[0] for tile in batch))
+        top = min(top, min(tile[1] for tile in batch))
+        bottom = max(bottom, max(tile[1] for tile in batch))
+        yield
+    grid = TileGrid((left, top), (right - left + 1, bottom - top + 1))
+    # backwards so the used tiles can be dropped a batch at a time, freeing them all at once stalls
+    for end in range(len(tiles), 0, -LOAD_BATCH):
+        start = max(0, end - LOAD_BATCH)
+        for x, y, name, variant in reversed(tiles[start:end]):
+            # a cell that's set already got its tile from later in the file, which wins
+            if not grid.get(x, y):
+                grid.set(x, y, type_id(name), variant)
+        del tiles[start:]
+        yield
+    # tile once up front, so later removals only need to re-tile their neighbours
+    yield from auto_tile_steps(grid)
+    return grid, off_grid
+
+def tile_variant(grid, x, y):
+    """The variant auto-tiling gives cell (x, y), from which of its four neighbours are auto-tiled too"""
+    mask = (grid.get(x - 1, y) in AUTO_TILE_IDS) << 3 | (grid.get(x, y - 1) in AUTO_TILE_IDS) << 2 | (grid.get(x + 1, y) in AUTO_TILE_IDS) << 1 | (grid.get(x, y + 1) in AUTO_TILE_IDS)
+    return AUTO_TILE_BITS[mask]
+
+def auto_tile_steps(grid):
+    """Auto-tile every cell of a freshly loaded grid, yielding between batches (nothing's baked yet to invalidate)"""
+    types, variants = grid.types, grid.variants
+    cells = list(grid.cells)
+    for start in range(0, len(cells), LOAD_BATCH):
+        for i in cells[start:start + LOAD_BATCH]:
+            if types[i] in AUTO_TILE_IDS:
+                variants[i] = tile_variant(grid, *grid.pos(i))
+        yield
 
 class TileMap:
     def __init__(self, app):
         self.app = app
-        self.tile_map = {} 
+        self.grid = TileGrid()
         self.off_grid = []
         self.tile_size = TILE_SIZE
+        # (cx, cy) -> baked chunk surface (None if the chunk has nothing to bake), least recently drawn first
+        self.chunks = {}
+        # (cx, cy) -> number of tiles baked into that chunk
+        self.chunk_tiles = {}
+        # tiles drawn by the last draw() call
+        self.visible = 0
+        # flat indices of tiles drawn one by one on top of the chunks (fading, portals)
+        self.loose = set()
+        # on-grid tiles bigger than a tile (decor), drawn behind the chunks since they'd spill over
+        self.large = set()
+        # min-heap of (destruction time, flat index) for tiles that have been walked on
+        self.pending = []
+
+    @property
+    def tile_map(self):
+        # "x;y" keyed view for code written against the old tile dict
+        return TileView(self.grid)
 
     def load(self, path):
-        # open file
-        data = read_json(path)
+        for _ in self.load_steps(path):
+            pass
 
-        self.tile_map = {}
-        self.off_grid = []
+    def load_steps(self, path, level=None):
+        """load() in small pieces, yields between them so a level can be built a little at a time,
+        level is what parse_level_steps(path) returned if that's been done already (e.g. on another thread)"""
+        grid, off_grid = level or (yield from parse_level_steps(path))
+        self.grid = grid
+        self.chunks = {}
+        self.chunk_tiles = {}
+        self.loose = set()
+        self.large = set()
+        self.pending = []
 
-        # load ongrid tiles
-        for tile in data['level']['tiles']:
-            tile_loc = f"{tile['pos'][0]};{tile['pos'][1]}"
-            self.tile_map[tile_loc] = {
-                'type': tile['type'], 
-                'variant': tile['variant'], 
-                'timer': 0, 
-                'pos': tile['pos'],
-                'walked_on': False,
-                'destruction_timer': 0.0
-            }
+        # sort out the tiles that can't be baked into chunks, type by type
+        size = (self.tile_size, self.tile_size)
+        for tid, cells in grid.by_type.items():
+            if tid == PORTAL_ID:
+                self.loose |= cells
+                continue
+            imgs = self.app.assets.get(f"tiles/{type_name(tid)}")
+            if imgs and all(img.get_size() == size for img in imgs):
+                continue
+            for i in cells:
+                img = self.tile_img(tid, grid.variants[i])
+                if img and img.get_size() != size:
+                    self.large.add(i)
+        yield
 
         # load off grid tiles
-        self.off_grid.extend(data['level']['off_grid'])
+        self.off_grid = []
+        self.off_grid.extend(off_grid)
         for tile in self.off_grid:
             tile['type'] = tile['type']
 
     def auto_tile(self):
-        for loc in self.tile_map:
-            tile = self.tile_map[loc]
-            aloc = ''
-            tile_pos = [int(i) * TILE_SIZE for i in loc.split(';')]
-            for shift in [(-1, 0), (0, -1), (1, 0), (0, 1)]:
-                check_loc = str(math.floor(tile_pos[0] / TILE_SIZE) + shift[0]) + ';' + str(math.floor(tile_pos[1] / TILE_SIZE) + shift[1])
-                if check_loc in self.tile_map:
-                    if self.tile_map[check_loc]['type'] in AUTO_TILE_TYPES:
-                        aloc += '1'
-                    else:
-                        aloc += '0'
-                else:
-                    aloc += '0'
-            if tile['type'] in AUTO_TILE_TYPES:
-                tile['variant'] = AUTO_TILE_MAP[aloc] - 1
+        for i in self.grid.occupied():
+            self.auto_tile_cell(*self.grid.pos(i))
+
+    def auto_tile_around(self, x, y):
+        """Re-tile (x, y) and its four neighbours, all that can change when that tile is added or removed"""
+        for shift in [(0, 0), (-1, 0), (0, -1), (1, 0), (0, 1)]:
+            self.auto_tile_cell(x + shift[0], y + shift[1])
+
+    def auto_tile_cell(self, x, y):
+        grid = self.grid
+        i = grid.index(x, y)
+        if i >= 0 and grid.types[i] in AUTO_TILE_IDS:
+            variant = tile_variant(grid, x, y)
+            if grid.variants[i] != variant:
+                grid.variants[i] = variant
+                self.invalidate(x, y)
+
+    def invalidate(self, x, y):
+        """Drop the baked chunk holding tile (x, y) so it gets re-rendered on the next draw"""
+        self.chunks.pop((x // CHUNK_SIZE, y // CHUNK_SIZE), None)
+        self.chunk_tiles.pop((x // CHUNK_SIZE, y // CHUNK_SIZE), None)
 
     def tiles_around(self, pos):
         tiles = []
         tile_loc = (int(pos[0] // self.tile_size), int(pos[1] // self.tile_size))
         for offset in OFFSETS:
-            check_loc = str(tile_loc[0] + offset[0]) + ';' + str(tile_loc[1] + offset[1])
-            if check_loc in self.tile_map:
-                tiles.append(self.tile_map[check_loc])
+            i = self.grid.index(tile_loc[0] + offset[0], tile_loc[1] + offset[1])
+            if i >= 0 and self.grid.types[i]:
+                tiles.append(TileRef(self.grid, i))
         return tiles
 
     def solid_check(self, pos):
-        tile_loc = str(int(pos[0] // self.tile_size)) + ';' + str(int(pos[1] // self.tile_size))
-        if tile_loc in self.tile_map:
-            if self.tile_map[tile_loc]['type'] in PHYSICS_TILES:
-                return self.tile_map[tile_loc]
-    
+        i = self.grid.index(int(pos[0] // self.tile_size), int(pos[1] // self.tile_size))
+        if i >= 0 and self.grid.types[i] in PHYSICS_IDS:
+            return TileRef(self.grid, i)
+
     def get_adjacent_tiles(self, tile_loc):
-        """Get all adjacent tiles for a given tile location"""
+        """Get all adjacent tiles for a given (x, y) tile location"""
         adjacent_tiles = []
-        # Parse the tile location
-        x, y = map(int, tile_loc.split(';'))
-        
+        x, y = tile_loc
+
         # Check all surrounding blocks using OFFSETS
         for dx, dy in OFFSETS:
-            adj_loc = f"{x + dx};{y + dy}"
-            if adj_loc in self.tile_map:
-                adjacent_tiles.append(adj_loc)
-        
+            if self.grid.get(x + dx, y + dy):
+                adjacent_tiles.append((x + dx, y + dy))
+
         return adjacent_tiles
-    
-    def get_3x3_destruction_area(self, tile_loc):
-        """Get a 3x3 area of tiles centered 1 block higher than the given tile location"""
-        destruction_tiles = []
-        # Parse the tile location
-        x, y = map(int, tile_loc.split(';'))
-        
-        # Create 3x3 grid centered 1 block higher (y-1)
-        center_x, center_y = x, y - 1
-        
-        # Generate 3x3 pattern around the center point
-        for dx in [-1, 0, 1]:
-            for dy in [-1, 0, 1]:
-                target_loc = f"{center_x + dx};{center_y + dy}"
-                if target_loc in self.tile_map:
-                    destruction_tiles.append(target_loc)
-        
-        return destruction_tiles
-    
-    def mark_tile_for_destruction(self, tile_loc, delay=0.0):
-        """Mark a tile for destruction with optional delay"""
-        if tile_loc in self.tile_map:
-            tile = self.tile_map[tile_loc]
-            if tile['type'] in DESTRUCTIBLE_TILES and not tile['walked_on']:
-                tile['walked_on'] = True
-                tile['destruction_timer'] = DESTRUCTION_TIME + delay
-    
-    def mark_tile_walked_on(self, pos):
-        """Mark tiles in a 3x3 pattern centered 1 block higher than the landing position"""
-        tile_loc = str(int(pos[0] // self.tile_size)) + ';' + str(int(pos[1] // self.tile_size))
-        
-        # Get the 3x3 destruction area centered 1 block higher
-        destruction_tiles = self.get_3x3_destruction_area(tile_loc)
-        
-        # Mark all tiles in the 3x3 area for destruction
-        for i, target_tile_loc in enumerate(destruction_tiles):
-            # Add a small stagger delay for visual effect (0.0 to 0.4 seconds)
-            delay = i * 0.05  # Each tile destroys 0.05 seconds after the previous
-            self.mark_tile_for_destruction(target_tile_loc, delay)
-    
+
     def get_3x3_destruction_area(self, tile_loc):
-        """Get a 3x3 area of tiles centered 1 block higher than the given tile location"""
+        """Get a 3x3 area of tiles centered 1 block higher than the given (x, y) tile location"""
         destruction_tiles = []
-        # Parse the tile location
-        x, y = map(int, tile_loc.split(';'))
-        
+        x, y = tile_loc
+
         # Create 3x3 grid centered 1 block higher (y-1)
         center_x, center_y = x, y - 1
-        
+
         # Generate 3x3 pattern around the center point
         for dx in [-1, 0, 1]:
             for dy in [-1, 0, 1]:
-                target_loc = f"{center_x + dx};{center_y + dy}"
-                if target_loc in self.tile_map:
-                    destruction_tiles.append(target_loc)
-        
+                if self.grid.get(center_x + dx, center_y + dy):
+                    destruction_tiles.append((center_x + dx, center_y + dy))
+
         return destruction_tiles
-    
+
     def mark_tile_for_destruction(self, tile_loc, delay=0.0):
         """Mark a tile for destruction with optional delay"""
-        if tile_loc in self.tile_map:
-            tile = self.tile_map[tile_loc]
-            if tile['type'] in DESTRUCTIBLE_TILES and not tile['walked_on']:
-                tile['walked_on'] = True
-                tile['destruction_timer'] = DESTRUCTION_TIME + delay
-                # print(f"Marked tile {tile_loc} for destruction in {DESTRUCTION_TIME + delay} seconds")
+        i = self.grid.index(*tile_loc)
+        if i >= 0 and self.grid.types[i]:
+            if self.grid.types[i] in DESTRUCTIBLE_IDS and not self.grid.walked_on[i]:
+                self.grid.walked_on[i] = 1
+                self.grid.destruction_timer[i] = self.grid.clock + DESTRUCTION_TIME + delay
+                heapq.heappush(self.pending, (self.grid.destruction_timer[i], i))
+                # fading tiles are drawn separately, so take it out of its chunk
+                self.loose.add(i)
+                self.invalidate(*tile_loc)
         else:
-            print(f"Tile {tile_loc} not found in tile_map")
-    
+            print(f"Tile {tile_loc[0]};{tile_loc[1]} not found in tile_map")
+
     def mark_tile_walked_on(self, pos):
         """Mark tiles in a 3x3 pattern centered 1 block higher than the landing position"""
-        tile_loc = str(int(pos[0] // self.tile_size)) + ';' + str(int(pos[1] // self.tile_size))
-        # print(f"Player landed on tile {tile_loc}, destroying 3x3 area centered 1 block higher")
-        
+        tile_loc = (int(pos[0] // self.tile_size), int(pos[1] // self.tile_size))
+
         # Get the 3x3 destruction area centered 1 block higher
         destruction_tiles = self.get_3x3_destruction_area(tile_loc)
-        # print(f"Found {len(destruction_tiles)} tiles in 3x3 destruction area")
-        
+
         # Mark all tiles in the 3x3 area for destruction
         for i, target_tile_loc in enumerate(destruction_tiles):
             # Add a small stagger delay for visual effect (0.0 to 0.4 seconds)
             delay = i * 0.05  # Each tile destroys 0.05 seconds after the previous
             self.mark_tile_for_destruction(target_tile_loc, delay)
-    
+
     def update(self, dt):
         """Update tile destruction timers"""
+        grid = self.grid
+        grid.clock += dt
         tiles_to_remove = []
         tiles_to_cascade = []  # Tiles that will trigger adjacent destruction
-        
-        for tile_loc, tile in self.tile_map.items():
-            if tile['walked_on'] and tile['type'] in DESTRUCTIBLE_TILES:
-                tile['destruction_timer'] -= dt
-                
-                if tile['destruction_timer'] <= 0:
-                    tiles_to_remove.append(tile_loc)
-                    tiles_to_cascade.append(tile_loc)
-                    # Play explosion sound when tile is destroyed
-                    if 'sfx/explosion' in self.app.assets:
-                        pass
-                        self.app.assets['sfx/explosion'].play()
-        
+
+        # only the timers that ran out are popped, the rest of the map isn't touched
+        while self.pending and self.pending[0][0] <= grid.clock:
+            _, i = heapq.heappop(self.pending)
+            if grid.walked_on[i] and grid.types[i] in DESTRUCTIBLE_IDS:
+                tiles_to_remove.append(grid.pos(i))
+                tiles_to_cascade.append(grid.pos(i))
+                # Play explosion sound when tile is destroyed
+                if 'sfx/explosion' in self.app.assets:
+                    pass
+                    self.app.assets['sfx/explosion'].play()
+
         # Remove destroyed tiles
         for tile_loc in tiles_to_remove:
-            if tile_loc in self.tile_map:  # Safety check
-                del self.tile_map[tile_loc]
-                self.auto_tile()
+            if grid.get(*tile_loc):  # Safety check
+                self.loose.discard(grid.index(*tile_loc))
+                self.large.discard(grid.index(*tile_loc))
+                grid.remove(*tile_loc)
+                self.invalidate(*tile_loc)
+                self.auto_tile_around(*tile_loc)
                 self.app.screen_shake = max(self.app.screen_shake, 4)
-                tile_pos = [int(coord) * 8 for coord in tile_loc.split(';')]
-                for _ in range(random.randint(10, 20)):
-                    speed = random.random() + 2
-                    angle = random.random() * math.pi * 2
-                    self.app.kickup.append([[tile_pos[0] + random.random() * 8, tile_pos[1] + random.random() * 8], [math.cos(angle) * speed, math.sin(angle) * speed], random.random() + 9, random.choice(self.app.kickup_palette)])
-                for _ in range(random.randint(10, 20)):
-                    self.app.sparks.append(Spark([tile_pos[0] + random.random() * 8, tile_pos[1] + random.random() * 8], random.random() * 2 * math.pi, random.random() * 1.5 + 0.5, (255, 255, 255)))
-                for _ in range(10, 20):
-                    self.app.smoke.append(Smoke(tile_pos[0] + random.random() * 16 - 8, tile_pos[1] + random.random() * 16 - 8, random.random() * 2 - 1, random.random() * 2 - 1, random.choice(self.app.kickup_palette)))
-                for _ in range(10, 20):
-                    self.app.fire.append([[tile_pos[0] + random.random() * 8, tile_pos[1] + random.random() * 8], random.randint(0, 1)])
+                tile_pos = [coord * 8 for coord in tile_loc]
+                # how much of each effect we spawn (and keep) depends on how well the game is running
+                quality = self.app.quality
+                kickup = min(rng.randint(quality.get('kickup') // 2, quality.get('kickup')), max(0, quality.get('max_kickup') - len(self.app.kickup)))
+                sparks = min(rng.randint(quality.get('sparks') // 2, quality.get('sparks')), max(0, quality.get('max_sparks') - len(self.app.sparks)))
+                smoke = min(quality.get('smoke'), max(0, quality.get('max_smoke') - len(self.app.smoke)))
+                fire = min(quality.get('fire'), max(0, quality.get('max_fire') - len(self.app.fire)))
+                for _ in range(kickup):
+                    speed = rng.random() + 2
+                    angle = rng.random() * math.pi * 2
+                    self.app.kickup.add([tile_pos[0] + rng.random() * 8, tile_pos[1] + rng.random() * 8], [math.cos(angle) * speed, math.sin(angle) * speed], rng.random() + 9, rng.choice(self.app.kickup_palette))
+                for _ in range(sparks):
+                    self.app.sparks.add([tile_pos[0] + rng.random() * 8, tile_pos[1] + rng.random() * 8], rng.random() * 2 * math.pi, rng.random() * 1.5 + 0.5, (255, 255, 255))
+                for _ in range(smoke):
+                    self.app.smoke.append(Smoke(tile_pos[0] + rng.random() * 16 - 8, tile_pos[1] + rng.random() * 16 - 8, rng.random() * 2 - 1, rng.random() * 2 - 1, rng.choice(self.app.kickup_palette)))
+                for _ in range(fire):
+                    self.app.fire.add([tile_pos[0] + rng.random() * 8, tile_pos[1] + rng.random() * 8], rng.randint(0, 1))
 
         # Cascade destruction to adjacent tiles (optional chain reaction)
         # Uncomment the lines below if you want chain reactions
@@ -219,68 +326,151 @@ class TileMap:
         #     adjacent_tiles = self.get_adjacent_tiles(tile_loc)
         #     for adj_tile_loc in adjacent_tiles:
         #         self.mark_tile_for_destruction(adj_tile_loc, 0.0)  # Chain reaction delay
-    
+
     def physics_rects_around(self, pos):
         rects = []
-        for tile in self.tiles_around(pos):
-            if tile['type'] in PHYSICS_TILES:
-                rects.append(pygame.Rect(tile['pos'][0] * self.tile_size, tile['pos'][1] * self.tile_size, self.tile_size, self.tile_size))
+        tile_loc = (int(pos[0] // self.tile_size), int(pos[1] // self.tile_size))
+        for offset in OFFSETS:
+            x, y = tile_loc[0] + offset[0], tile_loc[1] + offset[1]
+            if self.grid.get(x, y) in PHYSICS_IDS:
+                rects.append(pygame.Rect(x * self.tile_size, y * self.tile_size, self.tile_size, self.tile_size))
         # print(rects)
         return rects
 
+    def count(self, tile_type):
+        """Number of tiles of a type in the map"""
+        return len(self.grid.of_type(type_id(tile_type)))
+
+    def locations(self, tile_type):
+        """(x, y) tile locations of every tile of a type"""
+        return [self.grid.pos(i) for i in self.grid.of_type(type_id(tile_type))]
+
+    def nearest(self, tile_type, pos):
+        """(x, y) location of the tile of a type whose centre is closest to pos (in pixels), or None"""
+        nearest = None
+        best = None
+        for i in self.grid.of_type(type_id(tile_type)):
+            x, y = self.grid.pos(i)
+            distance = ((x + 0.5) * self.tile_size - pos[0]) ** 2 + ((y + 0.5) * self.tile_size - pos[1]) ** 2
+            if best is None or distance < best:
+                nearest = (x, y)
+                best = distance
+        return nearest
+
+    def tiles_in_rect(self, rect, tile_types):
+        """(x, y) locations of tiles of the given types touching rect (in pixels)"""
+        rect = pygame.Rect(rect)
+        left, top = rect.left // self.tile_size, rect.top // self.tile_size
+        right, bottom = (rect.right - 1) // self.tile_size, (rect.bottom - 1) // self.tile_size
+        tids = {type_id(t) for t in tile_types}
+        found = []
+        # walk whichever is smaller, the cells under the rect or the index of those types
+        if (right - left + 1) * (bottom - top + 1) < sum(len(self.grid.of_type(tid)) for tid in tids):
+            for y in range(top, bottom + 1):
+                for x in range(left, right + 1):
+                    if self.grid.get(x, y) in tids:
+                        found.append((x, y))
+        else:
+            for tid in tids:
+                for i in self.grid.of_type(tid):
+                    x, y = self.grid.pos(i)
+                    if left <= x <= right and top <= y <= bottom:
+                        found.append((x, y))
+        return found
+
+    def tile_img(self, tid, variant):
+        """Surface for a tile type id & variant, with the fallbacks draw has always used"""
+        tile_type = type_name(tid)
+        # Check if tile type exists in assets
+        if f"tiles/{tile_type}" in self.app.assets:
+            tile_assets = self.app.assets[f"tiles/{tile_type}"]
+            # Clamp variant to available range
+            if variant >= len(tile_assets):
+                variant = 0  # Fall back to first variant
+            return tile_assets[variant]
+        # Fallback to a default tile if type doesn't exist
+        print(f"Warning: Tile type '{tile_type}' not found in assets")
+        if "tiles/grass" in self.app.assets:
+            return self.app.assets["tiles/grass"][0]
+
+    def bake_chunk(self, cx, cy):
+        """Render every static tile in chunk (cx, cy) onto one surface"""
+        grid = self.grid
+        chunk_surf = None
+        baked = 0
+        for y in range(cy * CHUNK_SIZE, (cy + 1) * CHUNK_SIZE):
+            for x in range(cx * CHUNK_SIZE, (cx + 1) * CHUNK_SIZE):
+                i = grid.index(x, y)
+                if i >= 0 and grid.types[i] and i not in self.loose and i not in self.large:
+                    tile_surf = self.tile_img(grid.types[i], grid.variants[i])
+                    if tile_surf:
+                        if not chunk_surf:
+                            chunk_surf = pygame.Surface((CHUNK_SIZE * self.tile_size, CHUNK_SIZE * self.tile_size))
+                            chunk_surf.set_colorkey((0, 0, 0))
+                        chunk_surf.blit(tile_surf, ((x - cx * CHUNK_SIZE) * self.tile_size, (y - cy * CHUNK_SIZE) * self.tile_size))
+                        baked += 1
+        self.chunks[(cx, cy)] = chunk_surf
+        self.chunk_tiles[(cx, cy)] = baked
+        return chunk_surf
+
     def draw(self, surf, scroll):
         for tile in self.off_grid:
             surf.blit(self.app.assets[f"tiles/{tile['type']}"][tile['variant']], (tile['pos'][0] - scroll[0], tile['pos'][1] - scroll[1]))
 
-        for x in range(scroll[0] // self.tile_size, (scroll[0] + surf.get_width()) // self.tile_size + 1):
-            for y in range(scroll[1] // self.tile_size, (scroll[1] + surf.get_height()) // self.tile_size + 1):
-                loc = str(x) + ';' + str(y)
-                if loc in self.tile_map:
-                    tile = self.tile_map[loc]
-                    
-                    # Bounds check for tile variant to prevent IndexError
-                    tile_type = tile['type']
-                    tile_variant = tile['variant']
-                    
-                    # Check if tile type exists in assets
-                    if f"tiles/{tile_type}" in self.app.assets:
-                        tile_assets = self.app.assets[f"tiles/{tile_type}"]
-                        # Clamp variant to available range
-                        if tile_variant >= len(tile_assets):
-                            tile_variant = 0  # Fall back to first variant
-                        tile_surf = tile_assets[tile_variant].copy()
-                    else:
-                        # Fallback to a default tile if type doesn't exist
-                        print(f"Warning: Tile type '{tile_type}' not found in assets")
-                        if "tiles/grass" in self.app.assets:
-                            tile_surf = self.app.assets["tiles/grass"][0].copy()
-                        else:
-                            continue  # Skip this tile if no fallback available
-                    
-                    # Add visual feedback for tiles that are about to be destroyed
-                    if tile['walked_on'] and tile['type'] in DESTRUCTIBLE_TILES:
-                        # Calculate how much time is left (0.0 to 1.0)
-                        time_left = tile['destruction_timer'] / DESTRUCTION_TIME
-                        
-                        # Create a flashing/fading effect
-                        if time_left < 0.5:  # Start flashing when less than half time left
-                            flash_intensity = int((1 - time_left * 2) * 100)  # 0 to 100
-                            # Make tile flash red
-                            red_overlay = pygame.Surface((self.tile_size, self.tile_size))
-                            red_overlay.fill((255, 100, 100))
-                            red_overlay.set_alpha(flash_intensity)
-                            tile_surf.blit(red_overlay, (0, 0))
-                        
-                        # Make tile more transparent as it approaches destruction
-                        alpha = int(time_left * 255)
-                        tile_surf.set_alpha(alpha)
-                    
-                    # Calculate render position
-                    render_x = tile['pos'][0] * self.tile_size - scroll[0]
-                    render_y = tile['pos'][1] * self.tile_size - scroll[1]
-                    
-                    # Render portal blocks 1 block higher
-                    if tile['type'] == 'portal':
-                        render_y -= self.tile_size
-                    
-                    surf.blit(tile_surf, (render_x, render_y))
\ No newline at end of file
+        grid = self.grid
+        visible = 0
+        # tiles drawn one by one are culled against the screen (with a tile of margin)
+        view = pygame.Rect(scroll[0] - self.tile_size, scroll[1] - self.tile_size, surf.get_width() + self.tile_size * 2, surf.get_height() + self.tile_size * 2)
+        for i in self.large:
+            x, y = grid.pos(i)
+            tile_surf = self.tile_img(grid.types[i], grid.variants[i])
+            if view.colliderect(x * self.tile_size, y * self.tile_size, *tile_surf.get_size()):
+                surf.blit(tile_surf, (x * self.tile_size - scroll[0], y * self.tile_size - scroll[1]))
+                visible += 1
+
+        # static tiles, one blit per visible chunk
+        chunks = self.chunks
+        chunk_px = CHUNK_SIZE * self.tile_size
+        columns = range(scroll[0] // chunk_px, (scroll[0] + surf.get_width()) // chunk_px + 1)
+        rows = range(scroll[1] // chunk_px, (scroll[1] + surf.get_height()) // chunk_px + 1)
+        for cx in columns:
+            for cy in rows:
+                if (cx, cy) in chunks:
+                    # move it to the back, so the cache drops it last
+                    chunk_surf = chunks[(cx, cy)] = chunks.pop((cx, cy))
+                else:
+                    chunk_surf = self.bake_chunk(cx, cy)
+                if chunk_surf:
+                    surf.blit(chunk_surf, (cx * chunk_px - scroll[0], cy * chunk_px - scroll[1]))
+                    visible += self.chunk_tiles[(cx, cy)]
+        # never drop chunks that are on screen, however big the window gets
+        for key in list(islice(chunks, max(0, len(chunks) - max(CHUNK_CACHE, len(columns) * len(rows))))):
+            del chunks[key]
+            self.chunk_tiles.pop(key, None)
+
+        # loose tiles are drawn individually on top
+        for i in self.loose:
+            x, y = grid.pos(i)
+            tile_surf = self.tile_img(grid.types[i], grid.variants[i])
+            if not tile_surf:
+                continue  # Skip this tile if no fallback available
+
+            # Calculate render position
+            render_x = x * self.tile_size - scroll[0]
+            render_y = y * self.tile_size - scroll[1]
+            if not view.colliderect(x * self.tile_size, y * self.tile_size, *tile_surf.get_size()):
+                continue
+
+            # Add visual feedback for tiles that are about to be destroyed
+            if grid.walked_on[i] and grid.types[i] in DESTRUCTIBLE_IDS:
+                # pick the pre-rendered frame for how much time is left
+                step = round((grid.destruction_timer[i] - grid.clock) / DESTRUCTION_TIME * FADE_STEPS)
+                tile_surf = fade_frames(tile_surf)[max(0, min(FADE_STEPS, step))]
+
+            # Render portal blocks 1 block higher
+            if grid.types[i] == PORTAL_ID:
+                render_y -= self.tile_size
+
+            surf.blit(tile_surf, (render_x, render_y))
+            visible += 1
+        self.visible = visible
@@ -1,8 +1,20 @@
-import pygame, os, json
+import pygame, os, re, json, random
 
 BASE_IMG_PATH = 'data/images/'
 BASE_AUDIO_PATH = 'data/sound/'
 
+# characters read between the yields of read_json_steps
+READ_SLICE = 1 << 20
+# containers nested less deep than this are walked value by value by read_json_steps, deeper ones are decoded whole
+# (a level's tiles sit at depth 3: {"level": {"tiles": [tile, ...]}})
+JSON_SPLIT_DEPTH = 3
+# values decoded between the yields of read_json_steps
+JSON_BATCH = 500
+JSON_WHITESPACE = re.compile(r'[ \t\n\r]*')
+
+# per-session generator for everything the simulation rolls dice for, seeded so replays come out the same
+rng = random.Random()
+
 def load_image(path) -> pygame.Surface:
     surf = pygame.image.load(BASE_IMG_PATH + path).convert_alpha()
     surf.set_colorkey((0, 0, 0, 0))
@@ -14,35 +26,9 @@ def load_images(path):
         imgs.append(load_image(path + '/' + img_path))
     return imgs
 
-def load_animation(path, frame_dimensions, length):
-    img = load_image(path)
-    img_surf = pygame.Surface(frame_dimensions)
-    anim = []
-    for x in range(length):
-        img_surf.fill((0, 0, 0))
-        img_surf.blit(img, (-x * frame_dimensions[0], 0))
-        img_surf.convert_alpha()
-        img_surf.set_colorkey((0, 0, 0, 0))
-        anim.append(img_surf.copy())
-    return anim
-
 def load_sound(path) -> pygame.mixer.Sound:
     return pygame.mixer.Sound(BASE_AUDIO_PATH + path)
 
-def load_tile_imgs(path, tile_size):
-    img = load_image(path)
-    img_surf = pygame.Surface((tile_size, tile_size))
-    tiles = []
-    dimensions = [int(img.get_width() / tile_size), int(img.get_height() / tile_size)]
-    for y in range(dimensions[1]):
-        for x in range(dimensions[0]):
-            img_surf.fill((0, 0, 0))
-            img_surf.blit(img, (-x * tile_size, -y * tile_size))
-            img_surf.convert_alpha()
-            img_surf.set_colorkey((0, 0, 0, 0))
-            tiles.append(img_surf.copy())
-    return tiles
-
 def snip(spritesheet, pos, dimensions):
     clip_rect = pygame.Rect(pos, dimensions)
     image = spritesheet.subsurface(clip_rect)
@@ -54,6 +40,65 @@ def read_json(path):
     f.close()
     return data
 
+def finish(steps):
+    """Run a steps generator (one that yields between pieces of work) to the end, returns what it returns"""
+    while True:
+        try:
+            next(steps)
+        except StopIteration as done:
+            return done.value
+
+def read_json_steps(path, split_depth=JSON_SPLIT_DEPTH, pack=None):
+    """read_json() in small pieces, yields between them & returns the data (data = yield from read_json_steps(path)),
+    pack (if given) replaces each value decoded whole at split_depth, e.g. to keep a level's tiles compact"""
+    chunks = []
+    with open(path, 'r') as f:
+        while chunk := f.read(READ_SLICE):
+            chunks.append(chunk)
+            yield
+    text = ''.join(chunks)
+    decoder = json.JSONDecoder()
+    data, end = yield from _json_value_steps(decoder, text, 0, 0, split_depth, pack, [0])
+    if JSON_WHITESPACE.match(text, end).end() != len(text):
+        raise ValueError(f"{path}: extra data after the json at {end}")
+    return data
+
+def _json_value_steps(decoder, text, pos, depth, split_depth, pack, decoded):
+    """Decode the json value at pos, returns (value, end), decoded[0] counts the values decoded so far"""
+    pos = JSON_WHITESPACE.match(text, pos).end()
+    opener = text[pos:pos + 1]
+    if depth >= split_depth or opener not in ('{', '['):
+        value, end = decoder.raw_decode(text, pos)
+        if pack and depth == split_depth:
+            value = pack(value)
+        decoded[0] += 1
+        if decoded[0] % JSON_BATCH == 0:
+            yield
+        return value, end
+
+    closer = '}' if opener == '{' else ']'
+    result = {} if opener == '{' else []
+    pos = JSON_WHITESPACE.match(text, pos + 1).end()
+    if text.startswith(closer, pos):
+        return result, pos + 1
+    while True:
+        if opener == '{':
+            key, pos = decoder.raw_decode(text, pos)
+            pos = JSON_WHITESPACE.match(text, pos).end()
+            if not isinstance(key, str) or not text.startswith(':', pos):
+                raise ValueError(f"expected a key & ':' at {pos}")
+            result[key], pos = yield from _json_value_steps(decoder, text, pos + 1, depth + 1, split_depth, pack, decoded)
+        else:
+            value, pos = yield from _json_value_steps(decoder, text, pos, depth + 1, split_depth, pack, decoded)
+            result.append(value)
+        pos = JSON_WHITESPACE.match(text, pos).end()
+        if text.startswith(',', pos):
+            pos = JSON_WHITESPACE.match(text, pos + 1).end()
+        elif text.startswith(closer, pos):
+            return result, pos + 1
+        else:
+            raise ValueError(f"expected ',' or '{closer}' at {pos}")
+
 def write_json(path, data):
     f = open(path, 'w')
     json.dump(data, f)
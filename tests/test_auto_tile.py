@@ -0,0 +1,62 @@
+import glob, random
+from array import array
+
+import pygame
+import pytest
+
+from src.tiles import TileMap, TILE_SIZE, AUTO_TILE_MAP, AUTO_TILE_TYPES
+from src.grid import type_name
+
+MAPS = sorted(glob.glob('data/maps/*.json'))
+# full re-tiles to compare against per map, spread over the removals
+CHECKS = 20
+# plain frames handed out for every tile type, enough variants for any of them
+TILE_FRAMES = [pygame.Surface((TILE_SIZE, TILE_SIZE))] * len(AUTO_TILE_MAP)
+
+class Assets:
+    """Every tile type as plain tile-sized frames, so maps load without the real images"""
+    def get(self, name, default=None):
+        return TILE_FRAMES if name.startswith('tiles/') else default
+
+class App:
+    """Just enough of the app for a TileMap that is never drawn"""
+    def __init__(self):
+        self.assets = Assets()
+
+def reference_auto_tile(grid):
+    """Variants the original auto_tile gives the grid as it is now, from the '0101' neighbour strings
+    (left, up, right, down) looked up in AUTO_TILE_MAP"""
+    variants = array('B', grid.variants)
+    for i in grid.occupied():
+        if type_name(grid.types[i]) in AUTO_TILE_TYPES:
+            x, y = grid.pos(i)
+            neighbours = ''.join('1' if type_name(grid.get(x + dx, y + dy)) in AUTO_TILE_TYPES else '0' for dx, dy in [(-1, 0), (0, -1), (1, 0), (0, 1)])
+            variants[i] = AUTO_TILE_MAP[neighbours] - 1
+    return variants
+
+@pytest.mark.parametrize('path', MAPS)
+def test_auto_tile_around_matches_auto_tile(path):
+    tile_map = TileMap(App())
+    tile_map.load(path)
+    grid = tile_map.grid
+    assert grid.variants == reference_auto_tile(grid)
+
+    cells = grid.occupied()
+    random.Random(path).shuffle(cells)
+    every = max(1, len(cells) // CHECKS)
+    for n, i in enumerate(cells, 1):
+        x, y = grid.pos(i)
+        grid.remove(x, y)
+        tile_map.auto_tile_around(x, y)
+        if n % every == 0 or n == len(cells):
+            assert grid.variants == reference_auto_tile(grid), f"{path}: variants differ after {n} removals"
+
+@pytest.mark.parametrize('path', MAPS)
+def test_auto_tile_matches_auto_tile_map(path):
+    tile_map = TileMap(App())
+    tile_map.load(path)
+    grid = tile_map.grid
+    for i in grid.occupied():
+        grid.variants[i] = 0
+    tile_map.auto_tile()
+    assert grid.variants == reference_auto_tile(grid)
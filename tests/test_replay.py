@@ -0,0 +1,16 @@
+from src.replay import Recorder, Replay
+
+def test_actions_keep_their_order_and_repeats(tmp_path):
+    ticks = [
+        ({'up': True, 'down': False, 'left': False, 'right': True}, ['reset', 'start', 'reset'], 1.0, 2),
+        ({'up': False, 'down': False, 'left': False, 'right': False}, [], 0.5, 1),
+        ({'up': False, 'down': True, 'left': True, 'right': False}, ['pause', 'pause', 'restart'], 1.25, 0),
+    ]
+    recorder = Recorder(1234, 60, level=3)
+    for tick in ticks:
+        recorder.record(*tick)
+    recorder.save(tmp_path / 'run.rec')
+
+    replay = Replay(tmp_path / 'run.rec')
+    assert (replay.seed, replay.tick_rate, replay.level) == (1234, 60, 3)
+    assert [replay[i] for i in range(len(replay))] == [tuple(tick) for tick in ticks]